@@ -1,19 +1,34 @@
+import ipaddress
+import json
 import socket
 import threading
+import time
 from airsim import CarClient, CarControls
 import airsim
-from Command import AirSimCommand, CommandType, PropertyType, DriveMode
+from Command import AirSimCommand, CommandType, PropertyType, DriveMode, CommandLane, ControlState
+from CommandScheduler import CommandScheduler
+from ClientSessions import SessionTable
+from EventMonitor import CollisionEventMonitor
+from StreamGateway import StreamGateway
+from Profiler import SamplingProfiler, MIN_INTERVAL, MAX_INTERVAL
+from Telemetry import TelemetryPublisher
+from ControlOutput import ControlOutput
+from ResponseSender import ResponseSender, TERSE_OK, TERSE_ERROR, TERSE_NOT_CONNECTED
+from StatePredictor import VehicleStatePredictor
 
 
 class AirSimUDPController:
-    def __init__(self, udp_ip='', udp_port=8089):
+    def __init__(self, udp_ip='', udp_port=8089, tcp_port=None, ws_port=None):
         # AirSim客户端设置 ,在连接时再进行创建对象
         self.client = None
+        self.priority_client = None  # 高优先级通道专用的RPC连接，避免stop排在其他RPC之后
+        self.airsim_address = None  # (ip, port)，用于为后台线程建立独立的RPC连接
         self.airsim_connected = False
         # self.client.confirmConnection()
         # self.client.enableApiControl(True)
 
-        # 控制器
+        # 控制器：命令只修改 control_state，下发RPC时再写入 car_controls
+        self.control_state = ControlState()
         self.car_controls = CarControls()
         self.drive_mode = DriveMode.MANUAL  # 默认手动模式
         self.command_parser = AirSimCommand() # 创建一个命令的对象
@@ -24,11 +39,65 @@ class AirSimUDPController:
         self.sock = None
         self.is_running = False#表示udp是否在运行
 
+        # TCP/WebSocket长连接网关，端口为None时不启动
+        self.tcp_port = tcp_port
+        self.ws_port = ws_port
+        self.stream_gateway = None
+
+        # 命令调度：接收线程分类入队，高优先级通道有独立的处理线程
+        self.scheduler = None
+        self.worker_threads = []
+        self.control_lock = threading.Lock()  # 保护 car_controls 的修改与下发
+        # msgpack-rpc 客户端不是线程安全的：共享连接 self.client 的所有RPC都要持有 rpc_lock，
+        # priority_client 只在持有 control_lock 时使用；同时需要两个锁时先取 control_lock
+        self.rpc_lock = threading.Lock()
+        # 取消序号：每收到一条停车命令加一，早于它入队的控制/设置命令(不论来自哪个客户端)不再执行。
+        # epoch_lock 只保护序号本身，从不在RPC期间持有，接收线程不会被RPC阻塞
+        self.cancel_epoch = 0
+        self.epoch_lock = threading.Lock()
+        self.control_output = ControlOutput(self)  # 合并下发控制量，限制 setCarControls 的频率
+        self.sessions = SessionTable()  # 按客户端地址记录会话、限速和统计
+        self.response_sender = None  # 异步批量发送响应
+        self.verbose = True  # 是否在控制台打印文本模式的响应
+        self.last_drop_log = 0.0  # 上次打印排队丢弃信息的时间，避免洪泛时每个包都打印
+
+        # 运行时性能分析，只允许 admin_addrs 中的地址控制
+        self.admin_addrs = {'127.0.0.1'}
+        self.profiler = SamplingProfiler(output_dir='profiles')
+
+        # 组播遥测：按固定频率向组播组发布状态，监听端数量不影响控制器负载
+        self.telemetry = TelemetryPublisher(self)
+
+        # 预编码的常用响应，避免每次格式化和编码
+        self.text_not_connected = "AirSim未连接".encode('utf-8')
+        self.control_responses = {
+            cmd: f"执行控制命令: {cmd}".encode('utf-8') for cmd in self.command_parser.commands
+        }
+        self.mode_responses = {
+            DriveMode.MANUAL: "切换驾驶模式为: 手动".encode('utf-8'),
+            DriveMode.AUTONOMOUS: "切换驾驶模式为: 自动".encode('utf-8'),
+        }
+        self.text_control_ignored = "自动驾驶模式下忽略控制命令".encode('utf-8')
+        self.text_control_cancelled = "命令已被之后的停车命令取消".encode('utf-8')
+
         # 控制参数 默认值
         self.throttle = 0.3
         self.brake = 0.8
         self.steering = 0.2
 
+        # 车辆状态轮询与航位推算：两次轮询之间用外推结果回答查询
+        self.state_poll_interval = 0.05  # 向AirSim轮询getCarState的最小间隔(秒)，即20Hz
+        self.last_state_poll = 0.0
+        self.predictor = VehicleStatePredictor()
+        self.car_current_speed = 0.0
+        self.car_xposition = 0.0
+        self.car_yposition = 0.0
+        self.car_zposition = 0.0
+        self.car_velocity = (0.0, 0.0, 0.0)
+        self.car_orientation = (1.0, 0.0, 0.0, 0.0)
+
+        # 碰撞事件监视器：与UDP服务器同时运行，顺带以固定频率更新车辆状态
+        self.event_monitor = CollisionEventMonitor(self)
 
         # 初始化车辆状态
         self.update_vehicle_state()
@@ -40,7 +109,10 @@ class AirSimUDPController:
                 self.client = CarClient(ip=ip, port=int(port))
                 self.client.confirmConnection()
                 self.client.enableApiControl(True)
+                self.connect_priority_client(ip, port)
                 self.airsim_connected = True
+                if self.is_running:
+                    self.start_event_monitor()
                 return True
             except Exception as e:
                 print(f"连接AirSim失败: {e}")
@@ -51,15 +123,29 @@ class AirSimUDPController:
         """断开AirSim连接"""
         if self.airsim_connected and self.client:
             try:
-                self.client.enableApiControl(False)
+                self.event_monitor.stop()
+                with self.rpc_lock:
+                    self.client.enableApiControl(False)
                 self.client = None
+                self.priority_client = None
                 self.airsim_connected = False
+                self.predictor.reset()
+                self.last_state_poll = 0.0
                 return True
             except Exception as e:
                 print(f"断开AirSim连接失败: {e}")
                 return False
         return True
 
+    def connect_priority_client(self, ip, port):
+        """为高优先级通道建立独立的RPC连接，失败时退回使用共享连接"""
+        self.airsim_address = (ip, port)
+        try:
+            self.priority_client = CarClient(ip=ip, port=int(port))
+        except Exception as e:
+            print(f"建立高优先级RPC连接失败: {e}")
+            self.priority_client = None
+
 
 
     # def create_carcontroller(self):
@@ -68,85 +154,456 @@ class AirSimUDPController:
 
 
 
-    def update_vehicle_state(self):
-        """更新车辆状态信息"""
+    def update_vehicle_state(self, force=False):
+        """
+        更新车辆状态信息
+        距离上次轮询不足 state_poll_interval 时不发起RPC，直接用航位推算外推到当前时刻
+        :param force: 为True时无论间隔多少都向AirSim轮询一次
+        """
         if not self.airsim_connected or not self.client:
             return
 
-        self.car_state = self.client.getCarState()
-        self.car_current_speed = self.car_state.speed
-        position = self.car_state.kinematics_estimated.position # 使用局部变量保证过渡车辆的位置状态。
-        self.car_xposition = position.x_val
-        self.car_yposition = position.y_val
-        self.car_zposition = position.z_val
+        now = time.monotonic()
+        if force or now - self.last_state_poll >= self.state_poll_interval:
+            with self.rpc_lock:
+                car_state = self.client.getCarState()
+            self.on_car_state(car_state, now)
+
+        predicted = self.predictor.predict(now)
+        if predicted is None:
+            return
+        speed, position, velocity, orientation = predicted # 使用局部变量保证过渡车辆的位置状态。
+        self.car_current_speed = speed
+        self.car_xposition, self.car_yposition, self.car_zposition = position
+        self.car_velocity = velocity
+        self.car_orientation = orientation
+
+    def on_car_state(self, car_state, now):
+        """
+        记录一次真实的车辆状态采样(来自查询或事件监视器的批量轮询)
+        :param car_state: CarState 对象
+        :param now: 采样的本地时间戳
+        """
+        self.car_state = car_state
+        self.last_state_poll = now
+        self.predictor.update(car_state, now)
+
+    def handle_command(self, command, addr=None, client=None, epoch=None):
+        """
+        处理接收到的命令
+        :param command: 原始命令字符串
+        :param addr: 客户端地址，为None时不发送响应
+        :param client: 立即下发控制量使用的RPC连接，为None时交给输出线程合并下发
+        :param epoch: 命令入队时的取消序号，之后又收到过停车命令时不执行控制/设置命令
+        """
+        # 机器模式的客户端返回简洁的数字/JSON响应，跳过中文格式化
+        session = self.sessions.get(addr) if addr else None
+        terse = session is not None and session.terse
 
-    def handle_command(self, command, addr=None):
-        """处理接收到的命令"""
         if not self.airsim_connected:
             if addr:
-                self._send_response("AirSim未连接", addr)
+                self._send_response(TERSE_NOT_CONNECTED if terse else self.text_not_connected, addr)
             return
 
         parsed = self.command_parser.parse_command(command)
         if not parsed:
-            print(f"未知命令: {command}")
+            if terse:
+                self._send_response(TERSE_ERROR, addr)
+                return
+            response = f"未知命令: {command}"
+            print(response)
             if addr:
-                self._send_response(f"未知命令: {command}", addr)
+                self._send_response(response, addr)
             return
 
         command_type = parsed[0]
 
         if command_type == CommandType.CONTROL:
             # 控制命令处理
+            control_cmd = parsed[1]
             if self.drive_mode == DriveMode.MANUAL:
-                control_cmd = parsed[1]
-                self.car_controls = self.command_parser.execute_control(control_cmd, self.car_controls)
-                self.client.setCarControls(self.car_controls)
-                response = f"执行控制命令: {control_cmd}"
+                with self.control_lock:
+                    cancelled = self._is_cancelled(epoch)
+                    if not cancelled:
+                        self.command_parser.execute_control(control_cmd, self.control_state)
+                if cancelled:
+                    response = self.text_control_cancelled
+                else:
+                    self._output_controls(client)
+                    response = self.control_responses[control_cmd]
+            else:
+                response = self.text_control_ignored
+            if terse:
+                response = TERSE_OK if response is self.control_responses.get(control_cmd) else TERSE_ERROR
+            elif self.verbose:
+                print(response.decode('utf-8'))
+            if addr:
+                self._send_response(response, addr)
+            return
 
-        elif command_type == CommandType.SET:
+        if command_type == CommandType.SET:
             # 设置命令处理
             prop_type, value = parsed[1], parsed[2]
-            self.car_controls = self.command_parser.execute_set_command(prop_type, value, self.car_controls)
-            self.client.setCarControls(self.car_controls)
-            response = f"设置{prop_type.value}为: {value}"
+            with self.control_lock:
+                cancelled = self._is_cancelled(epoch)
+                if not cancelled:
+                    self.command_parser.execute_set_command(prop_type, value, self.control_state)
+            if cancelled:
+                response = TERSE_ERROR if terse else self.text_control_cancelled
+            else:
+                self._output_controls(client)
+                response = TERSE_OK if terse else f"设置{prop_type.value}为: {value}"
 
         elif command_type == CommandType.GET:
             # 获取状态命令处理
             self.update_vehicle_state()
             prop_type = parsed[1]
-            if prop_type == PropertyType.SPEED:
-                response = f"当前速度: {self.car_current_speed} m/s"
-            elif prop_type == PropertyType.POSITION:
-                response = f"当前位置: X={self.car_xposition:.2f}, Y={self.car_yposition:.2f}, Z={self.car_zposition:.2f}"
-            elif prop_type == PropertyType.ALL:
-                response = (
-                    "车辆状态:\n"
-                    f"速度: {self.car_current_speed} m/s\n"
-                    f"位置: X={self.car_xposition:.2f}, Y={self.car_yposition:.2f}, Z={self.car_zposition:.2f}\n"
-                    f"油门: {self.car_controls.throttle:.2f}, 刹车: {self.car_controls.brake:.2f}, 转向: {self.car_controls.steering:.2f}"
-                )
+            response = self._format_terse_state(prop_type) if terse else self._format_state(prop_type)
 
         elif command_type == CommandType.MODE:
             # 切换驾驶模式
             mode = parsed[1]
             self.drive_mode = mode
-            response = f"切换驾驶模式为: {'手动' if mode == DriveMode.MANUAL else '自动'}"
+            response = TERSE_OK if terse else self.mode_responses[mode]
+
+        elif command_type == CommandType.ADMIN:
+            # 管理命令处理
+            response = self.handle_admin_command(parsed[1], parsed[2], addr)
 
-        print(response)
+        if self.verbose and not terse:
+            print(response.decode('utf-8') if isinstance(response, bytes) else response)
         if addr:
             self._send_response(response, addr)
+
+    def _is_cancelled(self, epoch):
+        """
+        命令入队后又收到过停车命令时返回True
+        调用方持有 control_lock 执行检查和修改，停车命令本身也要取得 control_lock 才能生效，
+        因此检查之后才增加的序号不会让旧命令覆盖停车
+        """
+        return epoch is not None and epoch != self.cancel_epoch
+
+    def cancel_queued_controls(self):
+        """使所有已排队但尚未执行的控制/设置命令失效"""
+        with self.epoch_lock:
+            self.cancel_epoch += 1
+
+    def _output_controls(self, client=None):
+        """
+        下发控制量
+        :param client: 指定RPC连接时(高优先级通道)立即下发，否则交给输出线程合并下发
+        """
+        if client is None and self.control_output.is_running:
+            self.control_output.request()
+            return
+        with self.control_lock:
+            self._set_car_controls(client or self.client)
+
+    def _set_car_controls(self, client):
+        """
+        通过指定的RPC连接下发当前控制量(调用方需持有 control_lock)
+        :param client: priority_client 或共享连接 self.client
+        """
+        controls = self.control_state.apply_to(self.car_controls)
+        if client is self.client:
+            with self.rpc_lock:
+                client.setCarControls(controls)
+        else:
+            client.setCarControls(controls)
+
+    def apply_controls(self, throttle, brake, steering):
+        """
+        直接设置控制量(例如键盘遥控的定频输出)，与UDP控制命令走同一个合并下发路径
+        """
+        if not self.airsim_connected:
+            return
+        with self.control_lock:
+            state = self.control_state
+            state.throttle = throttle
+            state.brake = brake
+            state.steering = steering
+        self._output_controls()
+
+    def _format_state(self, prop_type):
+        """生成状态查询的文本响应"""
+        if prop_type == PropertyType.SPEED:
+            return f"当前速度: {self.car_current_speed:.2f} m/s"
+        if prop_type == PropertyType.POSITION:
+            return f"当前位置: X={self.car_xposition:.2f}, Y={self.car_yposition:.2f}, Z={self.car_zposition:.2f}"
+        if prop_type == PropertyType.ALL:
+            return (
+                "车辆状态:\n"
+                f"速度: {self.car_current_speed:.2f} m/s\n"
+                f"位置: X={self.car_xposition:.2f}, Y={self.car_yposition:.2f}, Z={self.car_zposition:.2f}\n"
+                f"油门: {self.car_controls.throttle:.2f}, 刹车: {self.car_controls.brake:.2f}, 转向: {self.car_controls.steering:.2f}"
+            )
+        if prop_type == PropertyType.PREDICTION:
+            count, last_error, mean_error, max_error = self.predictor.error_stats()
+            return (
+                f"预测误差: 最近={last_error:.3f} m, 平均={mean_error:.3f} m, "
+                f"最大={max_error:.3f} m, 样本数={count}, 轮询间隔={self.state_poll_interval * 1000:.0f} ms"
+            )
+        return f"不支持查询: {prop_type.value}"
+
+    def _format_terse_state(self, prop_type):
+        """生成状态查询的机器模式响应：单个数值直接返回数字，其余返回紧凑JSON"""
+        if prop_type == PropertyType.SPEED:
+            return b'%.3f' % self.car_current_speed
+        if prop_type == PropertyType.POSITION:
+            return b'%.3f,%.3f,%.3f' % (self.car_xposition, self.car_yposition, self.car_zposition)
+        if prop_type == PropertyType.ALL:
+            state = {
+                'speed': round(self.car_current_speed, 3),
+                'pos': [round(self.car_xposition, 3), round(self.car_yposition, 3), round(self.car_zposition, 3)],
+                'throttle': self.car_controls.throttle,
+                'brake': self.car_controls.brake,
+                'steering': self.car_controls.steering,
+                'mode': self.drive_mode.value,
+            }
+        elif prop_type == PropertyType.PREDICTION:
+            count, last_error, mean_error, max_error = self.predictor.error_stats()
+            state = {'n': count, 'last': last_error, 'mean': mean_error, 'max': max_error}
+        else:
+            return TERSE_ERROR
+        return json.dumps(state, separators=(',', ':')).encode('utf-8')
+
     # 自动驾驶模式接口
 
+    def emergency_stop(self):
+        """立即执行 stop 并通过高优先级RPC连接下发，不经过命令队列"""
+        if not self.airsim_connected:
+            return
+        # 与 stop 命令一样使已排队的控制命令失效，避免碰撞停车后又被排队中的 w 等命令驱动
+        self.cancel_queued_controls()
+        with self.control_lock:
+            self.command_parser.execute_control('stop', self.control_state)
+            self._set_car_controls(self.priority_client or self.client)
+        print("已自动停车")
+
+    def publish_event(self, text, terse):
+        """
+        向订阅事件的客户端推送事件记录
+        :param text: 文本格式的事件(bytes)
+        :param terse: 机器模式的事件(bytes)
+        """
+        if self.verbose:
+            print(text.decode('utf-8'))
+        if not self.is_running:
+            return
+        for session in self.sessions.subscribers():
+            self._send_response(terse if session.terse else text, session.addr)
+
+    def state_snapshot(self):
+        """
+        生成用于周期推送的紧凑JSON状态(只使用航位推算结果，不发起RPC)
+        :return: bytes，还没有车辆状态时返回 None
+        """
+        predicted = self.predictor.predict()
+        if predicted is None:
+            return None
+        speed, (x, y, z), velocity, _ = predicted
+        controls = self.control_state
+        state = {
+            't': round(time.time(), 3),
+            'speed': round(speed, 3),
+            'pos': [round(x, 3), round(y, 3), round(z, 3)],
+            'vel': [round(v, 3) for v in velocity],
+            'throttle': controls.throttle,
+            'brake': controls.brake,
+            'steering': controls.steering,
+            'mode': self.drive_mode.value,
+        }
+        return json.dumps(state, separators=(',', ':')).encode('utf-8')
+
+    def start_event_monitor(self):
+        """启动碰撞事件监视器(需要已知AirSim地址)"""
+        if self.airsim_address and not self.event_monitor.is_running:
+            self.event_monitor.start(*self.airsim_address)
+
+    def reset_controls(self):
+        """清空控制量并下发(例如切换到自动驾驶模式时)"""
+        if not self.airsim_connected or not self.client:
+            return
+        with self.control_lock:
+            self.control_state.reset()
+            self._set_car_controls(self.client)
+
+    def handle_admin_command(self, name, args, addr=None):
+        """
+        处理管理命令
+        :param name: 命令名
+        :param args: 命令参数字符串
+        :param addr: 客户端地址
+        :return: 响应消息
+        """
+        if name == 'lanes':
+            if not self.scheduler:
+                return "命令调度器未启动"
+            return "通道状态:\n" + self.scheduler.report()
+        if name == 'clients':
+            response = f"客户端({len(self.sessions)}):\n" + self.sessions.report()
+            if self.stream_gateway:
+                response += "\n长连接:\n" + self.stream_gateway.report()
+            return response
+        if name == 'weight':
+            return self._handle_weight_command(args, addr)
+        if name == 'stream':
+            # stream on|off 开关长连接的周期状态推送
+            if not hasattr(addr, 'send_state') or args not in ('on', 'off'):
+                return "用法: stream on|off (仅限TCP/WebSocket长连接)"
+            addr.stream_state = args == 'on'
+            return f"状态推送: {'开启' if addr.stream_state else '关闭'}"
+        if name == 'events':
+            return self._handle_events_command(args, addr)
+        if name == 'telemetry':
+            return self._handle_telemetry_command(args, addr)
+        if name == 'profile':
+            return self._handle_profile_command(args, addr)
+        if name == 'format':
+            # format text|json 切换该客户端的响应格式
+            session = self.sessions.get(addr) if addr else None
+            if session is None or args not in ('text', 'json'):
+                return "用法: format text|json"
+            session.terse = args == 'json'
+            return TERSE_OK if session.terse else "响应格式: 文本"
+        return f"未知管理命令: {name}"
+
+
+    def _handle_weight_command(self, args, addr):
+        """weight <ip:port> <权重> 设置客户端的调度权重(每轮最多连续处理的命令数)"""
+        if not self._is_admin(addr):
+            return "无权限: 该地址不允许执行 weight 命令"
+        try:
+            name, value = args.split()
+            weight = int(value)
+        except ValueError:
+            return "用法: weight <ip:port> <权重>"
+        if not 1 <= weight <= 64:
+            return "权重必须在 1-64 之间"
+        session = self.sessions.find(name)
+        if session is None:
+            return f"没有该客户端: {name}"
+        session.weight = weight
+        return f"客户端 {name} 的权重已设置为 {weight}"
+
+    def _handle_events_command(self, args, addr):
+        """events [on|off|autostop on|autostop off] 订阅碰撞事件或设置自动停车"""
+        monitor = self.event_monitor
+        session = self.sessions.get(addr) if addr else None
+        if args in ('on', 'off'):
+            if session is None:
+                return "只有UDP客户端可以订阅事件"
+            session.events = args == 'on'
+            if session.events:
+                return f"已订阅碰撞事件 (需在{self.sessions.idle_timeout:.0f}秒内发送任意命令保持会话)"
+            return "已取消订阅碰撞事件"
+        if args in ('autostop on', 'autostop off'):
+            monitor.auto_stop = args.endswith('on')
+            return f"碰撞自动停车: {'开启' if monitor.auto_stop else '关闭'}"
+        if args:
+            return "用法: events [on|off|autostop on|autostop off]"
+        return (
+            f"事件监视器: {'运行中' if monitor.is_running else '未运行'}, "
+            f"轮询频率={monitor.tick_rate:.0f} Hz, 去抖={monitor.debounce:.2f} s, "
+            f"自动停车={'开启' if monitor.auto_stop else '关闭'}, 已上报事件={monitor.event_count}, "
+            f"订阅客户端={len(self.sessions.subscribers())}"
+        )
+
+    def _handle_profile_command(self, args, addr):
+        """profile [start [间隔ms]|stop|dump] 运行时开关采样分析器并导出结果"""
+        if not self._is_admin(addr):
+            return "无权限: 该地址不允许执行 profile 命令"
+        profiler = self.profiler
+        action, _, value = args.partition(" ")
+        if action == 'start':
+            try:
+                interval = float(value) / 1000 if value else None
+            except ValueError:
+                return "用法: profile start [采样间隔ms]"
+            if interval is not None and not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+                return f"采样间隔必须在 {MIN_INTERVAL * 1000:.0f}-{MAX_INTERVAL * 1000:.0f} ms 之间"
+            if not profiler.start(interval):
+                return "分析器已在运行"
+            return f"分析器已启动, 采样间隔={profiler.interval * 1000:.1f} ms"
+        if action == 'stop':
+            if not profiler.stop():
+                return "分析器未运行"
+            return "分析器已停止\n" + profiler.summary()
+        if action == 'dump':
+            try:
+                path = profiler.dump()
+            except OSError as e:
+                return f"保存分析结果失败: {e}"
+            return f"分析结果已保存到: {path}\n" + profiler.summary()
+        if not action:
+            return f"分析器: {'运行中' if profiler.is_running else '未运行'}\n" + profiler.summary()
+        return "用法: profile [start [采样间隔ms]|stop|dump]"
+
+    def _handle_telemetry_command(self, args, addr):
+        """telemetry [start [组播地址:端口] [频率Hz]|stop] 开关组播遥测"""
+        telemetry = self.telemetry
+        action, _, rest = args.partition(" ")
+        if action in ('start', 'stop') and not self._is_admin(addr):
+            return "无权限: 该地址不允许执行 telemetry 命令"
+        if action == 'start':
+            if telemetry.is_running:
+                return "组播遥测已在运行"
+            # 先校验全部参数，参数有误时保留原来的设置
+            group, port, rate = telemetry.group, telemetry.port, telemetry.rate
+            try:
+                for option in rest.split():
+                    if ':' in option:
+                        group, port = option.rsplit(':', 1)
+                        address = ipaddress.ip_address(group)
+                        if address.version != 4 or not address.is_multicast:
+                            raise ValueError(f"不是IPv4组播地址: {group}")
+                        port = int(port)
+                        if not 0 < port < 65536:
+                            raise ValueError(f"端口超出范围: {port}")
+                    else:
+                        rate = float(option)
+                        if not 0 < rate <= 1000:
+                            raise ValueError(f"频率必须大于0且不超过1000 Hz: {option}")
+            except ValueError as e:
+                return f"启动组播遥测失败: {e}"
+            telemetry.group, telemetry.port, telemetry.rate = group, port, rate
+            try:
+                telemetry.start()
+            except OSError as e:
+                return f"启动组播遥测失败: {e}"
+        elif action == 'stop':
+            telemetry.stop()
+        elif action:
+            return "用法: telemetry [start [组播地址:端口] [频率Hz]|stop]"
+        return (
+            f"组播遥测: {'运行中' if telemetry.is_running else '未运行'}, "
+            f"组播组={telemetry.group}:{telemetry.port}, 频率={telemetry.rate:.0f} Hz, 序号={telemetry.seq}"
+        )
+
+    def _is_admin(self, addr):
+        """判断客户端地址是否允许执行管理操作"""
+        ip = addr[0] if isinstance(addr, tuple) else getattr(addr, 'peer', (None,))[0]
+        return ip in self.admin_addrs
 
     # 向客户端发送响应信息
     def _send_response(self, message, addr):
-        """通过UDP发送响应消息
-        :param message: 要发送的消息
+        """通过UDP发送响应消息，发送线程运行时放入发送队列异步批量发送
+        :param message: 要发送的消息(str或已编码的bytes)
         :param addr: 客户端地址(ip, port)
         """
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+        # TCP/WebSocket长连接直接写入该连接的写缓冲区
+        send_frame = getattr(addr, 'send_frame', None)
+        if send_frame is not None:
+            send_frame(message)
+            return
+        sender = self.response_sender
+        if sender is not None:
+            sender.send(message, addr)
+            return
         try:
-            self.sock.sendto(message.encode('utf-8'), addr)
+            self.sock.sendto(message, addr)
         except Exception as e:
             print(f"发送UDP响应失败: {e}")
 
@@ -156,23 +613,112 @@ class AirSimUDPController:
         while self.is_running:
             try:
                 data, addr = self.sock.recvfrom(1024) #获取客户端的ip地址
-                command = data.decode('utf-8')
-                # 将客户端地址传递给handle_command
-                self.handle_command(command, addr)
+                command = self.command_parser.decode_command(data)
+                self.submit_command(command, addr)
             except Exception as e:
                 print(f"接收UDP数据错误: {e}")
                 # 这里可以添加自动驾驶的初始化代码
 
+    def submit_command(self, command, addr):
+        """
+        所有传输方式共用的命令入口：分类后放入对应的优先级通道，由处理线程执行handle_command
+        :param command: 命令字符串
+        :param addr: 客户端地址(UDP为(ip, port)，长连接为连接对象)
+        :return: 入队成功返回True
+        """
+        lane = self.command_parser.classify_command(command)
+        session = self.sessions.touch(addr)
+        high = lane == CommandLane.HIGH
+        # 高优先级的安全命令使用单独且更宽松的令牌桶，普通命令用完配额时仍然可以停车
+        if not session.consume(session.last_seen, high):
+            return False
+        if high:
+            # 真正的停车命令使之前排队的控制命令全部失效，避免 stop 先执行后又被更早的 w 等命令覆盖
+            if self.command_parser.is_stop_command(command):
+                self.cancel_queued_controls()
+            epoch = None
+        else:
+            epoch = self.cancel_epoch
+        if not self.scheduler.submit(lane, command, addr, session.weight, epoch):
+            # 丢弃数量记录在通道统计中(lanes 命令查看)，日志每秒最多打印一次，避免拖慢接收线程
+            session.queue_dropped += 1
+            session.refund(high)
+            now = session.last_seen
+            if now - self.last_drop_log >= 1.0:
+                self.last_drop_log = now
+                print(f"{lane.value}通道已满，已累计丢弃{self.scheduler.stats[lane].dropped}条命令")
+            return False
+        return True
+
+    def start_stream_server(self):
+        """启动TCP/WebSocket长连接网关(与UDP服务器共用命令核心)"""
+        if self.stream_gateway or (self.tcp_port is None and self.ws_port is None):
+            return False
+        self.stream_gateway = StreamGateway(self, self.udp_ip, self.tcp_port, self.ws_port)
+        self.stream_gateway.start()
+        print(f"长连接网关已启动 TCP={self.tcp_port} WebSocket={self.ws_port}")
+        return True
+
+    def stop_stream_server(self):
+        """停止长连接网关"""
+        if self.stream_gateway:
+            self.stream_gateway.stop()
+            self.stream_gateway = None
+
+    def command_worker(self, lanes, priority=False):
+        """
+        命令处理线程
+        :param lanes: 负责的优先级通道，按优先级从高到低排列
+        :param priority: 为True时使用高优先级通道专用的RPC连接
+        """
+        scheduler = self.scheduler
+        while self.is_running:
+            item = scheduler.get(lanes)
+            if item is None:
+                break
+            _, command, addr, epoch = item
+            # 高优先级通道立即下发控制量，其余通道合并下发
+            client = (self.priority_client or self.client) if priority else None
+            try:
+                self.handle_command(command, addr, client, epoch)
+            except Exception as e:
+                print(f"处理命令错误: {command}: {e}")
+
+    def _start_workers(self):
+        """创建调度器并启动高优先级和普通处理线程"""
+        self.scheduler = CommandScheduler()
+        self.worker_threads = [
+            threading.Thread(target=self.command_worker, args=((CommandLane.HIGH,), True), name='command-high', daemon=True),
+            threading.Thread(target=self.command_worker, args=((CommandLane.NORMAL, CommandLane.LOW),), name='command-normal', daemon=True),
+        ]
+        for thread in self.worker_threads:
+            thread.start()
+
+    def _stop_workers(self):
+        """关闭调度器，处理线程会自行退出"""
+        if self.scheduler:
+            self.scheduler.close()
+        self.worker_threads = []
+
     def start(self):
         """启动UDP监听线程"""
-        self.thread = threading.Thread(target=self.udp_listener, daemon=True)
+        self.thread = threading.Thread(target=self.udp_listener, name='udp-listener', daemon=True)
         self.thread.start()
 
     def stop(self):
         """停止控制器"""
         self.is_running = False
+        self.event_monitor.stop()
+        self.telemetry.stop()
+        self.control_output.stop()
+        self.stop_stream_server()
+        self._stop_workers()
+        if self.response_sender:
+            self.response_sender.stop()
+            self.response_sender = None
         self.sock.close()
-        self.client.enableApiControl(False)
+        with self.rpc_lock:
+            self.client.enableApiControl(False)
         print("控制器已停止")
 
     def start_udp_server(self):
@@ -181,15 +727,30 @@ class AirSimUDPController:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
             self.sock.bind((self.udp_ip, self.udp_port))
             self.is_running = True
+            self.response_sender = ResponseSender(self.sock)
+            self.response_sender.start()
+            self._start_workers()
+            self.control_output.start()
+            self.start_stream_server()
+            if self.airsim_connected:
+                self.start_event_monitor()
             return True
         return False
 
     def stop_udp_server(self):
         """停止UDP服务器"""
         if self.is_running:
+            self.is_running = False
+            self.event_monitor.stop()
+            self.telemetry.stop()
+            self.control_output.stop()
+            self.stop_stream_server()
+            self._stop_workers()
+            if self.response_sender:
+                self.response_sender.stop()
+                self.response_sender = None
             self.sock.close()
             self.sock = None
-            self.is_running = False
             return True
         return False
 
@@ -0,0 +1,168 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 burst 个"""
+
+    __slots__ = ('tokens', 'rate', 'burst', 'last_refill', 'limited')
+
+    def __init__(self, now, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = now
+        self.limited = 0  # 因超出速率限制被丢弃的数量
+
+    def consume(self, now):
+        """
+        从令牌桶中取一个令牌
+        :return: 未超出速率限制返回True
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        self.limited += 1
+        return False
+
+    def refund(self):
+        """退还一个令牌(命令因排队已满被丢弃时不计入该客户端的速率)"""
+        self.tokens = min(self.burst, self.tokens + 1.0)
+
+
+class ClientSession:
+    """单个客户端的会话记录，使用 __slots__ 以减少大量客户端时的内存占用"""
+
+    __slots__ = (
+        'addr', 'first_seen', 'last_seen', 'packets', 'queue_dropped', 'bucket', 'high_bucket',
+        'weight', 'terse', 'events',
+    )
+
+    def __init__(self, addr, now, rate, burst, high_rate, high_burst, weight=1):
+        self.addr = addr
+        self.first_seen = now
+        self.last_seen = now
+        self.packets = 0  # 收到的数据包数量
+        self.queue_dropped = 0  # 因排队已满被丢弃的数量
+        # 普通命令和高优先级(安全)命令使用各自的令牌桶，普通命令用完配额后仍然可以停车，
+        # 但高优先级命令也不能无限制地发送
+        self.bucket = TokenBucket(now, rate, burst)
+        self.high_bucket = TokenBucket(now, high_rate, high_burst)
+        self.weight = weight  # 加权公平调度的权重，每轮最多连续处理 weight 条命令
+        self.terse = False  # 机器模式：返回数字/JSON而不是中文文本
+        self.events = False  # 是否订阅碰撞事件
+
+    def consume(self, now, high=False):
+        """
+        从对应的令牌桶中取一个令牌
+        :param high: 是否为高优先级命令
+        :return: 未超出速率限制返回True
+        """
+        return (self.high_bucket if high else self.bucket).consume(now)
+
+    def refund(self, high=False):
+        """退还一个令牌(命令因排队已满被丢弃时不计入该客户端的速率)"""
+        (self.high_bucket if high else self.bucket).refund()
+
+    @property
+    def name(self):
+        """用于显示和查找的客户端名称"""
+        addr = self.addr
+        return f"{addr[0]}:{addr[1]}" if isinstance(addr, tuple) else str(addr)
+
+
+class SessionTable:
+    """按客户端地址索引的会话表，负责速率限制和空闲会话的淘汰"""
+
+    def __init__(self, rate=200.0, burst=50, high_rate=50.0, high_burst=100, idle_timeout=60.0):
+        self.rate = rate  # 每个客户端默认每秒允许的命令数
+        self.burst = burst  # 允许的突发命令数
+        # 高优先级命令(stop/刹车/模式切换)的限速：突发更宽松，持续速率足够人工和程序停车使用
+        self.high_rate = high_rate
+        self.high_burst = high_burst
+        self.idle_timeout = idle_timeout  # 超过该时间(秒)没有收到数据包的会话会被淘汰
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_evict = 0.0
+
+    def touch(self, addr, now=None):
+        """
+        记录一次来自 addr 的数据包，必要时创建会话
+        :return: ClientSession 对象
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(addr)
+            if session is None:
+                session = ClientSession(addr, now, self.rate, self.burst, self.high_rate, self.high_burst)
+                self._sessions[addr] = session
+            session.last_seen = now
+            session.packets += 1
+        # 每秒最多检查一次空闲会话
+        if now - self._last_evict >= 1.0:
+            self.evict_idle(now)
+        return session
+
+    def get(self, addr):
+        with self._lock:
+            return self._sessions.get(addr)
+
+    def find(self, name):
+        """按显示名称(ip:port)查找会话，找不到返回 None"""
+        with self._lock:
+            for session in self._sessions.values():
+                if session.name == name:
+                    return session
+        return None
+
+    def remove(self, addr):
+        """删除会话(例如长连接断开时)"""
+        with self._lock:
+            self._sessions.pop(addr, None)
+
+    def subscribers(self):
+        """返回订阅了事件的会话列表"""
+        with self._lock:
+            return [session for session in self._sessions.values() if session.events]
+
+    def evict_idle(self, now=None):
+        """
+        淘汰空闲会话
+        :return: 被淘汰的会话数量
+        """
+        if now is None:
+            now = time.monotonic()
+        self._last_evict = now
+        with self._lock:
+            idle = [addr for addr, session in self._sessions.items()
+                    if now - session.last_seen > self.idle_timeout]
+            for addr in idle:
+                del self._sessions[addr]
+        return len(idle)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def report(self, now=None):
+        """生成各客户端的统计报告"""
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        if not sessions:
+            return "没有活动的客户端"
+        lines = []
+        for session in sessions:
+            duration = max(now - session.first_seen, 1.0)
+            lines.append(
+                f"{session.name} 数据包={session.packets} "
+                f"速率={session.packets / duration:.1f}/s 限速丢弃={session.bucket.limited} "
+                f"高优先级限速丢弃={session.high_bucket.limited} "
+                f"排队丢弃={session.queue_dropped} 权重={session.weight} "
+                f"空闲={now - session.last_seen:.1f} s"
+            )
+        return "\n".join(lines)
@@ -1,5 +1,6 @@
 from enum import Enum, auto
 import json
+import sys
 
 
 class CommandType(Enum):
@@ -8,6 +9,7 @@ class CommandType(Enum):
     GET = auto() # 用于获取车辆的状态信息 2
     CONTROL = auto() # 用于手动模式的车辆的行为 3
     MODE = auto() # 用于控制驾驶模式 4
+    ADMIN = auto() # 用于查询控制器自身的运行状态 5
 
 
 class PropertyType(Enum):
@@ -18,6 +20,7 @@ class PropertyType(Enum):
     SPEED = "speed"
     POSITION = "position"
     ALL = "all"
+    PREDICTION = "prediction"  # 航位推算的预测误差统计
 
 
 class DriveMode(Enum):
@@ -26,6 +29,42 @@ class DriveMode(Enum):
     AUTONOMOUS = "a"
 
 
+class CommandLane(Enum):
+    """命令优先级通道枚举"""
+    HIGH = "high" # 停止、模式切换、刹车等安全命令
+    NORMAL = "normal" # 常规控制和设置命令
+    LOW = "low" # 状态查询等批量读取命令
+
+
+class ControlState:
+    """
+    预分配的控制量结构体
+    控制命令只修改这里的字段，下发RPC时才写入 CarControls，热路径上不创建新对象
+    """
+
+    __slots__ = ('throttle', 'brake', 'steering')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """恢复为空控制量"""
+        self.throttle = 0.0
+        self.brake = 0.0
+        self.steering = 0.0
+
+    def apply_to(self, controls):
+        """
+        将控制量写入 CarControls 对象
+        :param controls: CarControls 对象
+        :return: 写入后的 CarControls 对象
+        """
+        controls.throttle = self.throttle
+        controls.brake = self.brake
+        controls.steering = self.steering
+        return controls
+
+
 class AirSimCommand:
     """AirSim UDP指令类"""
 
@@ -39,6 +78,91 @@ class AirSimCommand:
             'd': ('右转', self._right),
             'stop': ('停止', self._stop)
         }
+        # 管理命令 (不操作车辆)
+        self.admin_commands = {
+            'lanes': '查看各优先级通道的排队状态',
+            'clients': '查看各客户端的会话统计',
+            'weight': '设置客户端的调度权重',
+            'format': '切换响应格式 (text/json)',
+            'events': '订阅碰撞事件或设置碰撞自动停车',
+            'stream': '开关长连接的周期状态推送',
+            'profile': '运行时性能分析 (start/stop/dump)',
+            'telemetry': '开关组播遥测 (start/stop)',
+        }
+        # 预先取出的控制命令处理函数，分发时不再解包元组
+        self.control_handlers = {cmd: func for cmd, (_, func) in self.commands.items()}
+
+        # 高频小词汇命令的预解析缓存：原始命令(含常见的大小写和换行变体) -> 解析结果/通道
+        self._decode_cache = {}
+        self._parse_cache = {}
+        self._lane_cache = {}
+        frequent = list(self.commands)
+        frequent += [f"c {mode.value}" for mode in DriveMode]
+        frequent += [f"get {prop.value}" for prop in PropertyType]
+        for command in frequent:
+            parsed = self._parse(command)
+            lane = self._classify(command)
+            for base in (command, command.upper()):
+                for variant in (base, base + "\n", base + "\r\n"):
+                    variant = sys.intern(variant)
+                    self._decode_cache[variant.encode('utf-8')] = variant
+                    self._parse_cache[variant] = parsed
+                    self._lane_cache[variant] = lane
+
+    def decode_command(self, data):
+        """
+        将收到的数据解码为命令字符串，高频命令直接返回缓存的字符串
+        :param data: UDP数据(bytes)
+        :return: 命令字符串
+        """
+        command = self._decode_cache.get(data)
+        if command is None:
+            command = data.decode('utf-8')
+        return command
+
+    def classify_command(self, raw_command):
+        """
+        对原始命令做轻量分类，决定进入哪个优先级通道(不做完整解析)
+        :param raw_command: 原始命令字符串
+        :return: CommandLane 枚举值
+        """
+        lane = self._lane_cache.get(raw_command)
+        if lane is not None:
+            return lane
+        return self._classify(raw_command)
+
+    def _classify(self, raw_command):
+        """classify_command 的完整实现"""
+        command = raw_command.lower().strip()
+        if command == "stop" or command.startswith("c "):
+            return CommandLane.HIGH
+        if command.startswith("set "):
+            # 刹车属于安全命令
+            if command[4:].lstrip().startswith(PropertyType.BRAKE.value):
+                return CommandLane.HIGH
+            return CommandLane.NORMAL
+        if command in self.commands:
+            return CommandLane.NORMAL
+        return CommandLane.LOW
+
+    def is_stop_command(self, raw_command):
+        """
+        判断是否为真正让车辆停下的命令：stop、刹车值大于0的 set brake、切换到自动驾驶
+        这些命令会使之前排队的控制命令失效；set brake:0 和切换到手动模式不会
+        :param raw_command: 原始命令字符串
+        :return: bool
+        """
+        parsed = self.parse_command(raw_command)
+        if not parsed:
+            return False
+        command_type = parsed[0]
+        if command_type == CommandType.CONTROL:
+            return parsed[1] == "stop"
+        if command_type == CommandType.SET:
+            return parsed[1] == PropertyType.BRAKE and parsed[2] > 0
+        if command_type == CommandType.MODE:
+            return parsed[1] == DriveMode.AUTONOMOUS
+        return False
 
     def parse_command(self, raw_command):
         """
@@ -46,6 +170,14 @@ class AirSimCommand:
         :param raw_command: 原始命令字符串
         :return: (command_type, property_type, value) 或 (control_command,) //通过返回的元组来实现控制。
         """
+        # 高频命令直接返回预解析的结果，不做字符串处理和元组分配
+        parsed = self._parse_cache.get(raw_command)
+        if parsed is not None:
+            return parsed
+        return self._parse(raw_command)
+
+    def _parse(self, raw_command):
+        """parse_command 的完整实现"""
         command = raw_command.lower().strip() # 不让其区分大小写 去除空白字符
         # 空命令处理
         if not command:
@@ -91,6 +223,11 @@ class AirSimCommand:
             except ValueError:
                 return None
 
+        # 管理命令 (lanes) 格式：命令名 [参数]
+        name, _, args = command.partition(" ")
+        if name in self.admin_commands:
+            return (CommandType.ADMIN, name, args.strip())
+
         return None
 
     def execute_set_command(self, prop_type, value, controls):
@@ -98,8 +235,8 @@ class AirSimCommand:
         执行设置命令
         :param prop_type: PropertyType 枚举值
         :param value: 要设置的值
-        :param controls: CarControls 对象
-        :return: 修改后的 CarControls 对象
+        :param controls: ControlState 或 CarControls 对象
+        :return: 修改后的对象
         """
         if prop_type == PropertyType.THROTTLE:
             controls.throttle = float(value)
@@ -169,12 +306,10 @@ class AirSimCommand:
         """
         执行控制命令
         :param command: 控制命令 (w, a, s, d, stop)
-        :param controls: CarControls 对象
-        :return: 修改后的 CarControls 对象
+        :param controls: ControlState 或 CarControls 对象
+        :return: 修改后的对象
         """
-        if command in self.commands:
-            _, func = self.commands[command] # 获取元组中的方法传入
+        func = self.control_handlers.get(command) # 获取预先取出的处理函数
+        if func is not None:
             return func(controls)
-        elif command == "stop":
-            return self._stop(controls)
         return controls
\ No newline at end of file
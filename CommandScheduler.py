@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import deque
+
+from Command import CommandLane
+
+
+class LaneStats:
+    """单个优先级通道的统计信息"""
+
+    def __init__(self):
+        self.submitted = 0  # 入队数量
+        self.processed = 0  # 已出队处理的数量
+        self.dropped = 0  # 队列满时丢弃的数量
+        self.total_wait = 0.0  # 累计排队等待时间(秒)
+        self.max_wait = 0.0  # 最大排队等待时间(秒)
+
+    def record_wait(self, wait):
+        self.processed += 1
+        self.total_wait += wait
+        if wait > self.max_wait:
+            self.max_wait = wait
+
+    @property
+    def mean_wait(self):
+        return self.total_wait / self.processed if self.processed else 0.0
+
+
+class FairQueue:
+    """
+    按客户端分组的加权轮询队列
+    每个客户端有独立的子队列，出队时在有待处理命令的客户端之间轮转，
+    每轮最多连续取出该客户端 weight 条命令，避免单个高频客户端占满通道。
+    """
+
+    def __init__(self):
+        self._queues = {}  # addr -> deque
+        self._ring = deque()  # 有待处理命令的客户端轮转顺序
+        self._served = 0  # 当前队首客户端本轮已处理的命令数
+        self._weights = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def client_depth(self, addr):
+        queue = self._queues.get(addr)
+        return len(queue) if queue else 0
+
+    def append(self, addr, item, weight=1):
+        queue = self._queues.get(addr)
+        if queue is None:
+            queue = self._queues[addr] = deque()
+            self._ring.append(addr)
+        queue.append(item)
+        self._weights[addr] = weight
+        self.size += 1
+
+    def popleft(self):
+        addr = self._ring[0]
+        queue = self._queues[addr]
+        item = queue.popleft()
+        self.size -= 1
+        self._served += 1
+        if not queue:
+            # 客户端没有待处理命令，移出轮转
+            self._ring.popleft()
+            del self._queues[addr]
+            del self._weights[addr]
+            self._served = 0
+        elif self._served >= self._weights[addr]:
+            self._ring.rotate(-1)
+            self._served = 0
+        return item
+
+    def clear(self):
+        self._queues.clear()
+        self._ring.clear()
+        self._weights.clear()
+        self._served = 0
+        self.size = 0
+
+
+class CommandScheduler:
+    """
+    按优先级通道排队的命令调度器
+    接收线程只负责分类和入队，处理线程按通道优先级取出命令执行，
+    这样 stop 等安全命令不会排在大量 get/set 请求之后。
+    同一通道内按客户端加权轮询，单个客户端的排队长度也有上限。
+    """
+
+    def __init__(self, max_depth=None, max_client_depth=32):
+        # 每个通道的最大排队长度，超过后丢弃新命令
+        self.max_depth = {
+            CommandLane.HIGH: 64,
+            CommandLane.NORMAL: 256,
+            CommandLane.LOW: 256,
+        }
+        if max_depth:
+            self.max_depth.update(max_depth)
+        # 单个客户端在每个通道中的最大排队长度
+        self.max_client_depth = max_client_depth
+
+        self._cond = threading.Condition()
+        self._queues = {lane: FairQueue() for lane in CommandLane}
+        self.stats = {lane: LaneStats() for lane in CommandLane}
+        self.closed = False
+
+    def submit(self, lane, command, addr, weight=1, epoch=None):
+        """
+        命令入队
+        :param lane: CommandLane 枚举值
+        :param command: 原始命令字符串
+        :param addr: 客户端地址
+        :param weight: 该客户端的调度权重
+        :param epoch: 入队时控制器的取消序号，出队时原样返回
+        :return: 入队成功返回True，队列已满返回False
+        """
+        with self._cond:
+            queue = self._queues[lane]
+            stats = self.stats[lane]
+            if len(queue) >= self.max_depth[lane] or queue.client_depth(addr) >= self.max_client_depth:
+                stats.dropped += 1
+                return False
+            queue.append(addr, (time.monotonic(), command, addr, epoch), weight)
+            stats.submitted += 1
+            self._cond.notify_all()
+            return True
+
+    def get(self, lanes, timeout=None):
+        """
+        按给定顺序(严格优先级)从通道中取出一个命令，没有命令时阻塞等待
+        :param lanes: 该处理线程负责的通道，按优先级从高到低排列
+        :param timeout: 最长等待时间(秒)，None表示一直等待
+        :return: (lane, command, addr, epoch)，超时或调度器关闭时返回 None
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.closed:
+                for lane in lanes:
+                    queue = self._queues[lane]
+                    if queue:
+                        enqueued_at, command, addr, epoch = queue.popleft()
+                        self.stats[lane].record_wait(time.monotonic() - enqueued_at)
+                        return lane, command, addr, epoch
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+            return None
+
+    def depth(self, lane):
+        """当前排队长度"""
+        with self._cond:
+            return len(self._queues[lane])
+
+    def close(self):
+        """关闭调度器，唤醒所有等待的处理线程"""
+        with self._cond:
+            self.closed = True
+            for queue in self._queues.values():
+                queue.clear()
+            self._cond.notify_all()
+
+    def report(self):
+        """生成各通道的排队深度和等待时间报告"""
+        lines = []
+        with self._cond:
+            for lane in CommandLane:
+                stats = self.stats[lane]
+                lines.append(
+                    f"{lane.value}: 深度={len(self._queues[lane])}, 入队={stats.submitted}, "
+                    f"处理={stats.processed}, 丢弃={stats.dropped}, "
+                    f"平均等待={stats.mean_wait * 1000:.2f} ms, 最大等待={stats.max_wait * 1000:.2f} ms"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from airsim import CarClient
+
+
+class ControlOutput:
+    """
+    合并下发控制量的输出线程
+    控制命令只修改控制器的 control_state 并标记为待发送，输出线程最多以 max_rate 的频率
+    把最新的控制量通过 setCarControls 下发，中间被覆盖的旧值不会再单独发送。
+    空闲一段时间后的第一次修改会立即发送，因此不会增加单条命令的延迟。
+    msgpack-rpc 的客户端不是线程安全的，输出线程使用自己建立的独立RPC连接。
+    """
+
+    def __init__(self, controller, max_rate=50.0):
+        self.controller = controller
+        self.max_rate = max_rate  # setCarControls 的最高频率(Hz)
+        self._cond = threading.Condition()
+        self._dirty = False
+        self._last_send = 0.0
+        self._thread = None
+        self._stop_event = None  # 每次启动新建，重新启动后旧线程仍能看到自己的停止信号
+        self.is_running = False
+
+        # 统计
+        self.requests = 0  # 收到的下发请求数
+        self.sent = 0  # 实际发出的RPC数
+
+    def start(self):
+        if self.is_running:
+            return False
+        self._stop_event = threading.Event()
+        self.is_running = True
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop_event,), name='control-output', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止输出线程并等待正在进行的下发结束"""
+        if not self.is_running:
+            return
+        with self._cond:
+            self.is_running = False
+            self._stop_event.set()
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def request(self):
+        """标记控制量已修改，等待输出线程合并下发"""
+        with self._cond:
+            self._dirty = True
+            self.requests += 1
+            self._cond.notify()
+
+    def _run(self, stop_event):
+        interval = 1.0 / self.max_rate
+        client = None
+        address = None  # client 对应的AirSim地址，地址变化(重新连接)时重建连接
+        failing = False
+        while True:
+            with self._cond:
+                while not stop_event.is_set() and not self._dirty:
+                    self._cond.wait()
+                if stop_event.is_set():
+                    return
+                delay = self._last_send + interval - time.monotonic()
+            if delay > 0 and stop_event.wait(delay):
+                return
+
+            controller = self.controller
+            with self._cond:
+                self._dirty = False
+            if not controller.airsim_connected or controller.airsim_address is None:
+                continue
+            try:
+                if client is None or address != controller.airsim_address:
+                    address = controller.airsim_address
+                    client = CarClient(ip=address[0], port=int(address[1]))
+                with controller.control_lock:
+                    client.setCarControls(controller.control_state.apply_to(controller.car_controls))
+                self.sent += 1
+                failing = False
+            except Exception as e:
+                # 连续失败时只打印第一次
+                if not failing:
+                    print(f"下发控制量失败: {e}")
+                failing = True
+                client = None  # 重新建立连接
+                # 保留待发送标记，下一轮(受 max_rate 限制)用新连接重试，避免丢失最新的控制量
+                with self._cond:
+                    self._dirty = True
+            self._last_send = time.monotonic()
@@ -0,0 +1,143 @@
+import json
+import threading
+import time
+
+from airsim import CarClient, CarState, CollisionInfo
+
+
+class CollisionEventMonitor:
+    """
+    碰撞事件监视器
+    后台线程按固定频率用独立的RPC连接同时发出 getCarState 和 simGetCollisionInfo 请求，
+    车辆状态交给控制器的航位推算器，碰撞经去抖后作为事件推送给订阅的客户端。
+    """
+
+    def __init__(self, controller, tick_rate=20.0, debounce=0.5, vehicle_name=''):
+        self.controller = controller
+        self.tick_rate = tick_rate  # 每秒轮询次数
+        self.debounce = debounce  # 同一物体的碰撞在该时间(秒)内只上报一次
+        self.vehicle_name = vehicle_name
+        self.auto_stop = False  # 检测到碰撞时是否自动执行 stop
+
+        self.client = None
+        self.is_running = False
+        self._thread = None
+        self._stop_event = None  # 每次启动新建，重新启动后旧线程仍能看到自己的停止信号
+
+        self.event_count = 0  # 已上报的事件数量，同时作为事件序号
+        self._last_timestamp = None  # 最近一次碰撞信息的时间戳，用于判断是否为新碰撞
+        self._last_object = None
+        self._last_event_time = 0.0
+
+    def start(self, ip, port):
+        """建立独立的RPC连接并启动监视线程"""
+        if self.is_running:
+            return True
+        try:
+            self.client = CarClient(ip=ip, port=int(port))
+        except Exception as e:
+            print(f"事件监视器连接AirSim失败: {e}")
+            return False
+        self._last_timestamp = None
+        self._stop_event = threading.Event()
+        self.is_running = True
+        self._thread = threading.Thread(
+            target=self._run, args=(self.client, self._stop_event), name='event-monitor', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止监视线程并等待正在进行的轮询结束"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        self._stop_event.set()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        self.client = None
+
+    def poll(self, client=None):
+        """
+        一次批量轮询：两个RPC请求同时发出后再等待结果
+        :param client: 使用的 CarClient，默认为监视器自己的连接
+        :return: (CarState, CollisionInfo)
+        """
+        rpc = (client or self.client).client
+        state_future = rpc.call_async('getCarState', self.vehicle_name)
+        collision_future = rpc.call_async('simGetCollisionInfo', self.vehicle_name)
+        car_state = CarState.from_msgpack(state_future.get())
+        collision_info = CollisionInfo.from_msgpack(collision_future.get())
+        return car_state, collision_info
+
+    def _run(self, client, stop_event):
+        """
+        监视线程
+        :param client: 本次启动建立的RPC连接(stop 会清空 self.client，所以使用局部引用)
+        :param stop_event: 本次启动的停止信号
+        """
+        interval = 1.0 / self.tick_rate
+        next_tick = time.monotonic()
+        failing = False
+        while not stop_event.is_set():
+            try:
+                car_state, collision_info = self.poll(client)
+                now = time.monotonic()
+                self.controller.on_car_state(car_state, now)
+                self._check_collision(collision_info, car_state, now)
+                failing = False
+            except Exception as e:
+                # 连续失败时只打印第一次
+                if not stop_event.is_set() and not failing:
+                    print(f"事件监视器轮询失败: {e}")
+                failing = True
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+            else:
+                next_tick = time.monotonic()  # 轮询跟不上时不补发
+
+    def _check_collision(self, info, car_state, now):
+        """判断是否为新的碰撞，并按物体和时间去抖"""
+        if self._last_timestamp is None:
+            # 第一次轮询只记录时间戳，启动监视前已经存在的碰撞信息不上报
+            self._last_timestamp = info.time_stamp
+            return
+        if not info.has_collided or info.time_stamp == self._last_timestamp:
+            return
+        self._last_timestamp = info.time_stamp
+        if info.object_name == self._last_object and now - self._last_event_time < self.debounce:
+            return
+        self._last_object = info.object_name
+        self._last_event_time = now
+        self.event_count += 1
+
+        if self.auto_stop:
+            self.controller.emergency_stop()
+        self.controller.publish_event(*self.format_event(info, car_state))
+
+    def format_event(self, info, car_state):
+        """
+        生成碰撞事件记录
+        :return: (文本格式, 机器模式JSON格式)，均为已编码的bytes
+        """
+        position = info.position
+        text = (
+            f"事件#{self.event_count}: 碰撞 物体={info.object_name} "
+            f"位置: X={position.x_val:.2f}, Y={position.y_val:.2f}, Z={position.z_val:.2f} "
+            f"穿透深度={info.penetration_depth:.3f} 速度={car_state.speed:.2f} m/s"
+            f"{' 已自动停车' if self.auto_stop else ''}"
+        )
+        record = {
+            'ev': 'collision',
+            'seq': self.event_count,
+            't': info.time_stamp,
+            'obj': info.object_name,
+            'pos': [round(position.x_val, 3), round(position.y_val, 3), round(position.z_val, 3)],
+            'pen': round(info.penetration_depth, 4),
+            'speed': round(car_state.speed, 3),
+            'stop': self.auto_stop,
+        }
+        return text.encode('utf-8'), json.dumps(record, separators=(',', ':')).encode('utf-8')
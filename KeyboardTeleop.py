@@ -0,0 +1,79 @@
+class KeyboardTeleop:
+    """
+    平滑的键盘遥控
+    只记录按键的按下/松开状态，由定频的控制生成器调用 step() 按斜率把油门和转向
+    逐步逼近目标值，松开方向键后转向自动回正，因此控制量和RPC频率与系统的按键重复速率无关。
+    """
+
+    def __init__(self, max_throttle=0.5, reverse_throttle=-1.0, max_steering=0.5,
+                 throttle_rate=1.0, steering_rate=2.0, center_rate=3.0, coast_brake=0.2):
+        self.max_throttle = max_throttle  # 按住 w 时的目标油门
+        self.reverse_throttle = reverse_throttle  # 按住 s 时的目标油门(倒车)
+        self.max_steering = max_steering  # 按住 a/d 时的目标转向
+        self.throttle_rate = throttle_rate  # 油门每秒最大变化量
+        self.steering_rate = steering_rate  # 转向每秒最大变化量
+        self.center_rate = center_rate  # 松开方向键后转向回正的速度
+        self.coast_brake = coast_brake  # 没有按油门键且油门已回零时施加的刹车
+
+        self.pressed = set()
+        self.throttle = 0.0
+        self.brake = 0.0
+        self.steering = 0.0
+
+    def press(self, key):
+        self.pressed.add(key)
+
+    def release(self, key):
+        self.pressed.discard(key)
+
+    def reset(self):
+        """松开所有按键并清零控制量"""
+        self.pressed.clear()
+        self.throttle = 0.0
+        self.brake = 0.0
+        self.steering = 0.0
+
+    @property
+    def active(self):
+        """是否有按键按下或控制量尚未回到静止状态"""
+        return bool(self.pressed) or self.throttle != 0.0 or self.steering != 0.0
+
+    def step(self, dt):
+        """
+        按时间步长更新控制量
+        :param dt: 距上一次调用的时间(秒)
+        :return: 控制量发生变化返回True
+        """
+        pressed = self.pressed
+        forward, backward = 'w' in pressed, 's' in pressed
+        left, right = 'a' in pressed, 'd' in pressed
+
+        if forward and not backward:
+            target_throttle = self.max_throttle
+        elif backward and not forward:
+            target_throttle = self.reverse_throttle
+        else:
+            target_throttle = 0.0
+        throttle = _approach(self.throttle, target_throttle, self.throttle_rate * dt)
+
+        if left and not right:
+            steering = _approach(self.steering, -self.max_steering, self.steering_rate * dt)
+        elif right and not left:
+            steering = _approach(self.steering, self.max_steering, self.steering_rate * dt)
+        else:
+            steering = _approach(self.steering, 0.0, self.center_rate * dt)
+
+        brake = self.coast_brake if target_throttle == 0.0 and throttle == 0.0 else 0.0
+
+        changed = throttle != self.throttle or steering != self.steering or brake != self.brake
+        self.throttle, self.steering, self.brake = throttle, steering, brake
+        return changed
+
+
+def _approach(value, target, max_delta):
+    """以不超过 max_delta 的步长向目标值逼近"""
+    if value < target:
+        return min(value + max_delta, target)
+    if value > target:
+        return max(value - max_delta, target)
+    return value
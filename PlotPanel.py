@@ -0,0 +1,257 @@
+import math
+import time
+
+import numpy as np
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+# 数据列: 时间, 速度, 油门, 刹车, 转向, x, y
+COL_T, COL_SPEED, COL_THROTTLE, COL_BRAKE, COL_STEERING, COL_X, COL_Y = range(7)
+
+
+class RingBuffer:
+    """固定容量的 NumPy 环形缓冲区，写满后覆盖最旧的数据，内存占用不随时间增长"""
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, columns), dtype=np.float64)
+        self.index = 0  # 下一次写入的位置
+        self.count = 0  # 已保存的行数
+
+    def append(self, row):
+        self.data[self.index] = row
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def latest(self, n):
+        """按时间顺序返回最近 n 行(拷贝)，耗时只与 n 有关"""
+        n = min(n, self.count)
+        start = self.index - n
+        if start >= 0:
+            return self.data[start:self.index].copy()
+        return np.concatenate((self.data[start:], self.data[:self.index]))
+
+    def strided(self, max_points):
+        """按时间顺序从全部历史中等间隔取不超过 max_points 行，耗时只与 max_points 有关"""
+        if self.count == 0:
+            return self.data[:0]
+        step = max(1, math.ceil(self.count / max_points))
+        first = (self.index - self.count) % self.capacity
+        indices = (first + np.arange(0, self.count, step)) % self.capacity
+        # 保证最新的一行一定包含在内
+        last = (self.index - 1) % self.capacity
+        if indices[-1] != last:
+            indices = np.append(indices, last)
+        return self.data[indices]
+
+
+def minmax_decimate(x, y, bins):
+    """
+    最小/最大值降采样：把数据分成 bins 段，每段保留最小值和最大值两个点，
+    保证尖峰不会因为降采样而丢失
+    :return: (x, y) 最多 2*bins 个点
+    """
+    n = len(y)
+    if n <= 2 * bins:
+        return x, y
+    per_bin = n // bins
+    # 丢弃最旧的余数部分，使数据可以整齐地分段
+    start = n - per_bin * bins
+    ys = y[start:].reshape(bins, per_bin)
+    xs = x[start:].reshape(bins, per_bin)
+    rows = np.arange(bins)
+    imin = ys.argmin(axis=1)
+    imax = ys.argmax(axis=1)
+    # 每段内按出现的先后顺序输出最小值和最大值
+    first = np.minimum(imin, imax)
+    second = np.maximum(imin, imax)
+    out_x = np.empty(2 * bins)
+    out_y = np.empty(2 * bins)
+    out_x[0::2] = xs[rows, first]
+    out_x[1::2] = xs[rows, second]
+    out_y[0::2] = ys[rows, first]
+    out_y[1::2] = ys[rows, second]
+    return out_x, out_y
+
+
+def _to_polygon(x, y):
+    """将坐标数组直接写入 QPolygonF 的内存，避免逐点创建 QPointF"""
+    n = len(x)
+    polygon = QtGui.QPolygonF(n)
+    if n == 0:
+        return polygon
+    ptr = polygon.data()
+    ptr.setsize(n * 2 * 8)
+    points = np.frombuffer(ptr, dtype=np.float64).reshape(n, 2)
+    points[:, 0] = x
+    points[:, 1] = y
+    return polygon
+
+
+class _PlotWidget(QtWidgets.QWidget):
+    """绘图控件的公共部分：边框、标题和数据到像素的坐标变换"""
+
+    margin = 6
+
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.setMinimumSize(240, 120)
+
+    def plot_rect(self):
+        m = self.margin
+        return QtCore.QRectF(m, m + 14, self.width() - 2 * m, self.height() - 2 * m - 14)
+
+    def draw_frame(self, painter):
+        painter.fillRect(self.rect(), QtCore.Qt.white)
+        painter.setPen(QtGui.QPen(QtCore.Qt.lightGray))
+        painter.drawRect(self.plot_rect())
+        painter.setPen(QtGui.QPen(QtCore.Qt.black))
+        painter.drawText(self.margin, self.margin + 10, self.title)
+
+    @staticmethod
+    def to_pixels(values, lo, hi, pixel_lo, pixel_hi):
+        span = hi - lo if hi > lo else 1.0
+        return pixel_lo + (values - lo) * ((pixel_hi - pixel_lo) / span)
+
+
+class ScrollingPlot(_PlotWidget):
+    """滚动时间曲线，显示最近 window_seconds 秒的若干列数据"""
+
+    def __init__(self, title, buffer, columns, colors, y_range=None, window_seconds=60.0, parent=None):
+        super().__init__(title, parent)
+        self.buffer = buffer
+        self.columns = columns
+        self.colors = [QtGui.QColor(color) for color in colors]
+        self.y_range = y_range  # 固定的纵轴范围，None表示自动缩放
+        self.window_seconds = window_seconds
+        self.sample_rate = 50.0  # 用于估算窗口内的样本数
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        self.draw_frame(painter)
+        rect = self.plot_rect()
+        rows = self.buffer.latest(int(self.window_seconds * self.sample_rate))
+        if len(rows) < 2:
+            return
+
+        # 每个像素列最多两个点，绘制开销只与控件宽度有关
+        bins = max(1, int(rect.width()))
+        t = rows[:, COL_T]
+        t_hi = t[-1]
+        t_lo = t_hi - self.window_seconds
+        if self.y_range:
+            y_lo, y_hi = self.y_range
+        else:
+            values = rows[:, self.columns]
+            y_lo, y_hi = float(values.min()), float(values.max())
+            pad = max((y_hi - y_lo) * 0.05, 0.1)
+            y_lo, y_hi = y_lo - pad, y_hi + pad
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        for column, color in zip(self.columns, self.colors):
+            x, y = minmax_decimate(t, rows[:, column], bins)
+            px = self.to_pixels(x, t_lo, t_hi, rect.left(), rect.right())
+            py = self.to_pixels(y, y_lo, y_hi, rect.bottom(), rect.top())
+            painter.setPen(QtGui.QPen(color, 1))
+            painter.drawPolyline(_to_polygon(px, py))
+
+        painter.setPen(QtGui.QPen(QtCore.Qt.darkGray))
+        painter.drawText(rect.adjusted(2, 0, 0, 0), QtCore.Qt.AlignTop | QtCore.Qt.AlignLeft, f"{y_hi:.2f}")
+        painter.drawText(rect.adjusted(2, 0, 0, 0), QtCore.Qt.AlignBottom | QtCore.Qt.AlignLeft, f"{y_lo:.2f}")
+
+
+class TrajectoryPlot(_PlotWidget):
+    """XY轨迹图，显示全部历史，按控件大小等间隔取点"""
+
+    def __init__(self, title, buffer, parent=None):
+        super().__init__(title, parent)
+        self.buffer = buffer
+        self.setMinimumSize(240, 240)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        self.draw_frame(painter)
+        rect = self.plot_rect()
+        rows = self.buffer.strided(int(rect.width() + rect.height()) * 2)
+        if len(rows) < 2:
+            return
+
+        # AirSim 为 NED 坐标系，x 朝北画在纵轴，y 朝东画在横轴，保持等比例
+        xs, ys = rows[:, COL_X], rows[:, COL_Y]
+        cx, cy = (xs.max() + xs.min()) / 2, (ys.max() + ys.min()) / 2
+        half = max(xs.max() - xs.min(), ys.max() - ys.min(), 1.0) / 2 * 1.1
+        aspect = rect.width() / rect.height()
+        half_w, half_h = (half * aspect, half) if aspect >= 1 else (half, half / aspect)
+        px = self.to_pixels(ys, cy - half_w, cy + half_w, rect.left(), rect.right())
+        py = self.to_pixels(xs, cx - half_h, cx + half_h, rect.bottom(), rect.top())
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, True)
+        painter.setPen(QtGui.QPen(QtGui.QColor('#1f77b4'), 1))
+        painter.drawPolyline(_to_polygon(px, py))
+        painter.setBrush(QtGui.QColor('#d62728'))
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.drawEllipse(QtCore.QPointF(px[-1], py[-1]), 3, 3)
+
+
+class PlotPanel(QtWidgets.QWidget):
+    """
+    实时曲线面板：速度、控制量和XY轨迹
+    数据保存在固定大小的环形缓冲区中(默认1小时@50Hz)，重绘开销只与控件尺寸有关。
+    """
+
+    def __init__(self, parent=None, capacity=50 * 3600, fps=30):
+        super().__init__(parent)
+        self.buffer = RingBuffer(capacity, 7)
+        self._row = np.zeros(7)
+        self._start_time = time.monotonic()
+        self._dirty = False
+
+        self.speed_plot = ScrollingPlot("速度 (m/s)", self.buffer, [COL_SPEED], ['#1f77b4'], parent=self)
+        self.controls_plot = ScrollingPlot(
+            "油门/刹车/转向", self.buffer, [COL_THROTTLE, COL_BRAKE, COL_STEERING],
+            ['#2ca02c', '#d62728', '#ff7f0e'], y_range=(-1.05, 1.05), parent=self,
+        )
+        self.trajectory_plot = TrajectoryPlot("XY轨迹", self.buffer, parent=self)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.speed_plot, 1)
+        layout.addWidget(self.controls_plot, 1)
+        layout.addWidget(self.trajectory_plot, 2)
+
+        # 按固定帧率重绘，只有新数据到来时才重绘
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.redraw)
+        self.timer.start(int(1000 / fps))
+
+    def set_sample_rate(self, rate):
+        """设置采样频率(Hz)，用于换算滚动窗口内的样本数"""
+        self.speed_plot.sample_rate = rate
+        self.controls_plot.sample_rate = rate
+
+    def append_sample(self, speed, throttle, brake, steering, x, y):
+        """追加一个样本，不触发重绘"""
+        row = self._row
+        row[COL_T] = time.monotonic() - self._start_time
+        row[COL_SPEED] = speed
+        row[COL_THROTTLE] = throttle
+        row[COL_BRAKE] = brake
+        row[COL_STEERING] = steering
+        row[COL_X] = x
+        row[COL_Y] = y
+        self.buffer.append(row)
+        self._dirty = True
+
+    def clear(self):
+        self.buffer.index = 0
+        self.buffer.count = 0
+        self._dirty = True
+
+    def redraw(self):
+        if self._dirty and self.isVisible():
+            self._dirty = False
+            self.speed_plot.update()
+            self.controls_plot.update()
+            self.trajectory_plot.update()
@@ -0,0 +1,163 @@
+import dis
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# 处于阻塞等待的栈顶函数，采样时跳过，避免空闲线程淹没真正的热点
+_IDLE_FRAMES = {
+    ('threading.py', 'wait'),  # Condition/Event.wait
+    ('threading.py', '_wait_for_tstate_lock'),  # Thread.join
+    ('selectors.py', 'select'),
+}
+# 阻塞在C函数中的线程栈顶仍是调用它的Python函数，按 (文件名, 函数名) 登记这些位置及其阻塞调用，
+# 栈顶指令正在执行登记的调用时视为空闲。其余位置的同名调用(如 str.join)照常统计
+_BLOCKING_SITES = {
+    ('AirSimControl.py', 'udp_listener'): frozenset({'recvfrom'}),
+    ('main.py', '<module>'): frozenset({'exec_'}),
+}
+_CALL_OPS = frozenset({'CALL', 'CALL_FUNCTION', 'CALL_METHOD', 'CALL_FUNCTION_KW', 'CALL_FUNCTION_EX'})
+# 采样间隔的范围(秒)：间隔过小时分析器本身会占用大量CPU
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 1.0
+
+
+def _line_calls(code, offset):
+    """
+    offset 处为调用指令时，返回同一行中在它之前加载的名称(被调用的函数名在其中)
+    :return: 名称集合，offset 处不是调用指令时返回空集合
+    """
+    names = set()
+    for instr in dis.get_instructions(code):
+        if instr.starts_line is not None:
+            names.clear()  # 新的一行
+        if instr.offset == offset:
+            return names if instr.opname in _CALL_OPS else set()
+        if instr.opname.startswith('LOAD_') and isinstance(instr.argval, str):
+            names.add(instr.argval)
+    return set()
+
+
+class SamplingProfiler:
+    """
+    低开销的采样分析器
+    后台线程按固定间隔读取所有线程的调用栈(sys._current_frames)，
+    不需要修改被分析的代码，也不会像 cProfile 那样拖慢每一次函数调用，
+    可以在运行中随时开启和关闭。结果以 collapsed-stack 格式保存，可直接用于生成火焰图。
+    """
+
+    def __init__(self, output_dir='profiles', interval=0.005):
+        self.output_dir = output_dir  # 结果文件的保存目录
+        self.interval = interval  # 采样间隔(秒)
+        self.stacks = Counter()  # 折叠后的调用栈 -> 采样次数
+        self.leaf_counts = Counter()  # 栈顶函数所在行 -> 采样次数(自身耗时)
+        self.samples = 0
+        self.idle_samples = 0  # 被跳过的线程空闲采样数
+        self.started_at = None
+        self.duration = 0.0
+        self.is_running = False
+        self._thread = None
+        self._names = {}  # 代码对象 -> 显示名称的缓存
+        self._blocking_sites = {}  # (代码对象, 指令偏移) -> 是否为阻塞调用的缓存
+
+    def start(self, interval=None):
+        """开始采样，之前的采样结果会被清空"""
+        if self.is_running:
+            return False
+        if interval is not None:
+            if not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+                raise ValueError(f"采样间隔必须在 {MIN_INTERVAL * 1000:.0f}-{MAX_INTERVAL * 1000:.0f} ms 之间: {interval}")
+            self.interval = interval
+        self.stacks.clear()
+        self.leaf_counts.clear()
+        self.samples = 0
+        self.idle_samples = 0
+        self.duration = 0.0
+        self.started_at = time.monotonic()
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止采样，保留采样结果以便导出"""
+        if not self.is_running:
+            return False
+        self.is_running = False
+        self._thread.join(timeout=1.0)
+        self.duration = time.monotonic() - self.started_at
+        return True
+
+    def _frame_name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._names[code] = name
+        return name
+
+    def _is_blocking_call(self, code, offset):
+        """判断栈顶指令是否为登记的阻塞调用(结果按代码对象和指令偏移缓存)"""
+        key = (code, offset)
+        blocking = self._blocking_sites.get(key)
+        if blocking is None:
+            calls = _BLOCKING_SITES.get((os.path.basename(code.co_filename), code.co_name))
+            blocking = bool(calls) and not calls.isdisjoint(_line_calls(code, offset))
+            self._blocking_sites[key] = blocking
+        return blocking
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while self.is_running:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                code = frame.f_code
+                if ((os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+                        or self._is_blocking_call(code, frame.f_lasti)):
+                    self.idle_samples += 1
+                    continue
+                # 热点按栈顶函数的当前行统计，能区分阻塞在系统调用上的行和真正的计算
+                self.leaf_counts[f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"] += 1
+                names = []
+                while frame is not None:
+                    names.append(self._frame_name(frame.f_code))
+                    frame = frame.f_back
+                names.append(thread_names.get(ident, str(ident)))
+                names.reverse()
+                self.stacks[';'.join(names)] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def top(self, n=10):
+        """
+        按自身采样次数排序的热点函数
+        :return: [(函数名, 采样次数, 占比)]
+        """
+        total = sum(self.leaf_counts.values()) or 1
+        return [(name, count, count / total) for name, count in self.leaf_counts.most_common(n)]
+
+    def dump(self):
+        """
+        将 collapsed-stack 结果写入输出目录
+        :return: 文件路径
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, time.strftime('profile-%Y%m%d-%H%M%S.folded'))
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def summary(self, n=10):
+        """生成热点函数摘要"""
+        duration = self.duration if not self.is_running else time.monotonic() - self.started_at
+        lines = [
+            f"采样次数={self.samples}, 时长={duration:.1f} s, 间隔={self.interval * 1000:.1f} ms, "
+            f"跳过空闲={self.idle_samples}"
+        ]
+        for name, count, ratio in self.top(n):
+            lines.append(f"{ratio * 100:5.1f}% {count:6d} {name}")
+        return "\n".join(lines)
@@ -0,0 +1,174 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import socket
+import struct
+import threading
+from collections import deque
+
+
+# 预编码的常用响应 (机器模式)
+TERSE_OK = b'ok'
+TERSE_ERROR = b'err'
+TERSE_NOT_CONNECTED = b'err:disconnected'
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(_IOVec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+def _load_sendmmsg():
+    """加载 libc 中的 sendmmsg (仅Linux提供)，不可用时返回 None"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError, TypeError):
+        return None
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return sendmmsg
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+class ResponseSender:
+    """
+    异步批量UDP响应发送器
+    处理线程只把响应放入发送队列，由独立的发送线程批量发出，
+    套接字发送缓冲区满时只会阻塞发送线程而不会阻塞命令处理。
+    """
+
+    def __init__(self, sock, batch_size=64, max_pending=4096):
+        self.sock = sock
+        self.batch_size = batch_size  # 每次系统调用最多发送的数据包数
+        self.max_pending = max_pending  # 发送队列上限，超过后丢弃最旧的响应
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self.is_running = False
+
+        # 统计
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0  # 队列溢出或发送失败而丢弃的响应数
+
+        # sendmmsg 只用于 IPv4 套接字，预先分配批量发送所需的结构体
+        self.use_sendmmsg = _sendmmsg is not None and sock.family == socket.AF_INET
+        if self.use_sendmmsg:
+            self._msgs = (_MMsgHdr * batch_size)()
+            self._iovs = (_IOVec * batch_size)()
+            self._names = [ctypes.create_string_buffer(16) for _ in range(batch_size)]
+            self._sockaddr_cache = {}
+
+    def start(self):
+        """启动发送线程"""
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name='response-sender', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止发送线程，丢弃未发送的响应，等待正在发送的一批完成后返回(之后才能关闭套接字)"""
+        with self._cond:
+            self.is_running = False
+            self._queue.clear()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def send(self, payload, addr):
+        """
+        将响应放入发送队列
+        :param payload: 已编码的响应数据(bytes)
+        :param addr: 客户端地址(ip, port)
+        """
+        with self._cond:
+            if len(self._queue) >= self.max_pending:
+                self._queue.popleft()
+                self.dropped += 1
+            self._queue.append((payload, addr))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.is_running and not self._queue:
+                    self._cond.wait()
+                if not self.is_running:
+                    return
+                count = min(len(self._queue), self.batch_size)
+                batch = [self._queue.popleft() for _ in range(count)]
+            # 单个响应发送失败(例如超过UDP最大长度)只丢弃该响应，同一批中的其他响应继续发送
+            if self.use_sendmmsg:
+                self._send_batch_mmsg(batch)
+            else:
+                for payload, addr in batch:
+                    try:
+                        self.sock.sendto(payload, addr)
+                        self.sent += 1
+                    except Exception as e:
+                        self._drop_failed(addr, e)
+            self.batches += 1
+
+    def _drop_failed(self, addr, error):
+        """记录一个发送失败而被丢弃的响应"""
+        self.dropped += 1
+        print(f"发送UDP响应失败 {addr}: {error}")
+
+    def _sockaddr(self, addr):
+        """将 (ip, port) 编码为 sockaddr_in，结果按地址缓存"""
+        sockaddr = self._sockaddr_cache.get(addr)
+        if sockaddr is None:
+            ip, port = addr
+            sockaddr = struct.pack('=H', socket.AF_INET) + struct.pack('!H', port) + socket.inet_aton(ip) + bytes(8)
+            if len(self._sockaddr_cache) > 4096:
+                self._sockaddr_cache.clear()
+            self._sockaddr_cache[addr] = sockaddr
+        return sockaddr
+
+    def _send_batch_mmsg(self, batch):
+        """用一次 sendmmsg 系统调用发送整批数据包"""
+        fd = self.sock.fileno()
+        msgs, iovs, names = self._msgs, self._iovs, self._names
+        for i, (payload, addr) in enumerate(batch):
+            ctypes.memmove(names[i], self._sockaddr(addr), 16)
+            iovs[i].iov_base = ctypes.cast(ctypes.c_char_p(payload), ctypes.c_void_p)
+            iovs[i].iov_len = len(payload)
+            hdr = msgs[i].msg_hdr
+            hdr.msg_name = ctypes.cast(names[i], ctypes.c_void_p)
+            hdr.msg_namelen = 16
+            hdr.msg_iov = ctypes.pointer(iovs[i])
+            hdr.msg_iovlen = 1
+
+        offset = 0
+        total = len(batch)
+        while offset < total:
+            sent = _sendmmsg(fd, ctypes.pointer(msgs[offset]), total - offset, 0)
+            if sent < 0:
+                # 返回-1表示 offset 处的第一个数据包发送失败，跳过它继续发送剩余的数据包
+                code = ctypes.get_errno()
+                if code == errno.EINTR:
+                    continue
+                self._drop_failed(batch[offset][1], OSError(code, os.strerror(code)))
+                offset += 1
+                continue
+            self.sent += sent
+            offset += sent
@@ -0,0 +1,143 @@
+import math
+import threading
+import time
+
+
+class VehicleStatePredictor:
+    """车辆状态航位推算器
+
+    保存最近一次从AirSim获取的运动学状态(位置、速度、加速度、姿态)，
+    在两次轮询之间按匀加速模型外推到当前时刻，
+    并在收到下一次真实采样时统计预测误差。
+    """
+
+    def __init__(self, max_horizon=0.5):
+        # 外推的最长时间(秒)，超过后不再继续外推，避免长时间断连后误差发散
+        self.max_horizon = max_horizon
+        self._lock = threading.Lock()
+
+        # 最近一次采样的本地时间戳(time.monotonic())，None表示还没有采样
+        self.sample_time = None
+        self.speed = 0.0
+        self.position = (0.0, 0.0, 0.0)
+        self.velocity = (0.0, 0.0, 0.0)
+        self.acceleration = (0.0, 0.0, 0.0)
+        self.orientation = (1.0, 0.0, 0.0, 0.0)  # 四元数 (w, x, y, z)
+        self.angular_velocity = (0.0, 0.0, 0.0)
+
+        # 预测误差统计 (位置误差，单位米)
+        self.error_count = 0
+        self.last_error = 0.0
+        self.mean_error = 0.0
+        self.max_error = 0.0
+
+    def update(self, car_state, sample_time=None):
+        """
+        用新的真实采样更新状态，并统计上一次状态对本次采样的预测误差
+        :param car_state: getCarState() 返回的 CarState 对象
+        :param sample_time: 采样的本地时间戳，默认取当前时间
+        :return: 本次的预测误差(米)，第一次采样时返回 None
+        """
+        if sample_time is None:
+            sample_time = time.monotonic()
+        kinematics = car_state.kinematics_estimated
+        position = _vec(kinematics.position)
+
+        with self._lock:
+            error = None
+            if self.sample_time is not None:
+                predicted = self._extrapolate_position(sample_time - self.sample_time)
+                error = math.dist(predicted, position)
+                self.error_count += 1
+                self.last_error = error
+                self.mean_error += (error - self.mean_error) / self.error_count
+                if error > self.max_error:
+                    self.max_error = error
+
+            self.sample_time = sample_time
+            self.speed = car_state.speed
+            self.position = position
+            self.velocity = _vec(kinematics.linear_velocity)
+            self.acceleration = _vec(kinematics.linear_acceleration)
+            orientation = kinematics.orientation
+            self.orientation = (orientation.w_val, orientation.x_val, orientation.y_val, orientation.z_val)
+            self.angular_velocity = _vec(kinematics.angular_velocity)
+            return error
+
+    def predict(self, now=None):
+        """
+        将最近一次的状态外推到指定时刻
+        :param now: 本地时间戳，默认取当前时间
+        :return: (speed, position, velocity, orientation)，还没有采样时返回 None
+        """
+        if now is None:
+            now = time.monotonic()
+
+        with self._lock:
+            if self.sample_time is None:
+                return None
+            dt = min(max(now - self.sample_time, 0.0), self.max_horizon)
+
+            position = self._extrapolate_position(dt)
+            vx, vy, vz = self.velocity
+            ax, ay, az = self.acceleration
+            velocity = (vx + ax * dt, vy + ay * dt, vz + az * dt)
+
+            # 标量速度沿当前速度方向的加速度分量变化，保留原始速度的符号(倒车时为负)
+            speed = self.speed
+            norm = math.hypot(vx, vy, vz)
+            if norm > 1e-6:
+                speed += (ax * vx + ay * vy + az * vz) / norm * dt * (1 if speed >= 0 else -1)
+
+            orientation = _integrate_orientation(self.orientation, self.angular_velocity, dt)
+            return speed, position, velocity, orientation
+
+    def reset(self):
+        """清空状态和误差统计(例如断开AirSim连接时)"""
+        with self._lock:
+            self.sample_time = None
+            self.error_count = 0
+            self.last_error = 0.0
+            self.mean_error = 0.0
+            self.max_error = 0.0
+
+    def error_stats(self):
+        """返回预测误差统计 (采样次数, 最近误差, 平均误差, 最大误差)"""
+        with self._lock:
+            return self.error_count, self.last_error, self.mean_error, self.max_error
+
+    def _extrapolate_position(self, dt):
+        """匀加速模型: p + v*dt + 0.5*a*dt^2"""
+        px, py, pz = self.position
+        vx, vy, vz = self.velocity
+        ax, ay, az = self.acceleration
+        half_dt2 = 0.5 * dt * dt
+        return (
+            px + vx * dt + ax * half_dt2,
+            py + vy * dt + ay * half_dt2,
+            pz + vz * dt + az * half_dt2,
+        )
+
+
+def _vec(vector3r):
+    """Vector3r 转为元组"""
+    return (vector3r.x_val, vector3r.y_val, vector3r.z_val)
+
+
+def _integrate_orientation(q, omega, dt):
+    """按恒定角速度(机体系)将四元数旋转 dt 秒"""
+    wx, wy, wz = omega
+    rate = math.hypot(wx, wy, wz)
+    if rate < 1e-9 or dt <= 0:
+        return q
+    half_angle = 0.5 * rate * dt
+    s = math.sin(half_angle) / rate
+    dw, dx, dy, dz = math.cos(half_angle), wx * s, wy * s, wz * s
+    qw, qx, qy, qz = q
+    # q * dq
+    return (
+        qw * dw - qx * dx - qy * dy - qz * dz,
+        qw * dx + qx * dw + qy * dz - qz * dy,
+        qw * dy - qx * dz + qy * dw + qz * dx,
+        qw * dz + qx * dy - qy * dx + qz * dw,
+    )
@@ -0,0 +1,413 @@
+import base64
+import hashlib
+import selectors
+import socket
+import struct
+import threading
+import time
+
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_LENGTH = struct.Struct('!I')
+
+
+class StreamConnection:
+    """
+    一个TCP或WebSocket长连接
+    对象本身作为客户端地址传给命令核心，响应通过 send_frame 写回该连接
+    """
+
+    def __init__(self, gateway, sock, peer, websocket=False):
+        self.gateway = gateway
+        self.sock = sock
+        self.peer = peer
+        self.websocket = websocket
+        self.handshake_done = not websocket
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.pending_state = None  # 写缓冲区过高时只保留最新的一帧状态
+        self.stream_state = False  # 是否订阅周期状态推送
+        self.closed = False
+        self.lock = threading.Lock()
+
+        # 统计
+        self.frames_in = 0
+        self.frames_out = 0
+        self.states_skipped = 0  # 因背压被新状态替换掉的旧状态帧数
+
+    def __str__(self):
+        scheme = 'ws' if self.websocket else 'tcp'
+        return f"{scheme}://{self.peer[0]}:{self.peer[1]}"
+
+    def send_frame(self, payload):
+        """
+        发送一帧响应(可在任意线程调用)
+        写缓冲区超过上限说明客户端太慢，直接断开连接
+        """
+        frame = self._encode(payload)
+        with self.lock:
+            if self.closed:
+                return
+            if len(self.outbuf) + len(frame) > self.gateway.max_buffer:
+                self.gateway.request_close(self, "写缓冲区溢出")
+                return
+            self.outbuf += frame
+            self.frames_out += 1
+        self.gateway.wakeup()
+
+    def send_state(self, payload):
+        """
+        推送最新状态：写缓冲区高于高水位时不排队，只替换待发送的状态帧
+        """
+        with self.lock:
+            if self.closed:
+                return
+            if len(self.outbuf) >= self.gateway.high_water:
+                if self.pending_state is not None:
+                    self.states_skipped += 1
+                self.pending_state = payload
+                return
+            self.outbuf += self._encode(payload)
+            self.frames_out += 1
+
+    def _encode(self, payload):
+        if not self.websocket:
+            return _LENGTH.pack(len(payload)) + payload
+        # WebSocket 文本帧，服务器发出的帧不加掩码
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x81, length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x81, 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x81, 127, length)
+        return header + payload
+
+
+class StreamGateway:
+    """
+    TCP/WebSocket 长连接网关
+    TCP使用4字节大端长度前缀分帧，WebSocket供浏览器仪表盘使用。
+    收到的命令与UDP命令走同一个命令核心(分类、限速、调度、handle_command)。
+    每个连接有独立的写缓冲区，超过高水位后状态推送只保留最新一帧。
+    """
+
+    def __init__(self, controller, host='', tcp_port=None, ws_port=None,
+                 high_water=64 * 1024, max_buffer=4 * 1024 * 1024, max_frame=64 * 1024, state_rate=20.0):
+        self.controller = controller
+        self.host = host
+        self.tcp_port = tcp_port
+        self.ws_port = ws_port
+        self.high_water = high_water  # 写缓冲区高水位(字节)
+        self.max_buffer = max_buffer  # 写缓冲区上限(字节)，超过后断开连接
+        self.max_frame = max_frame  # 允许接收的最大帧长度(字节)
+        self.state_rate = state_rate  # 状态推送频率(Hz)
+
+        self.selector = None
+        self.connections = set()
+        self.is_running = False
+        self._thread = None
+        self._listeners = []
+        self._to_close = []
+        self._wake_r, self._wake_w = None, None
+
+    def start(self):
+        """创建监听套接字并启动网关线程"""
+        if self.is_running:
+            return False
+        self.selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+        for port, websocket in ((self.tcp_port, False), (self.ws_port, True)):
+            if port is None:
+                continue
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, port))
+            listener.listen()
+            listener.setblocking(False)
+            self.selector.register(listener, selectors.EVENT_READ, websocket)
+            self._listeners.append(listener)
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name='stream-gateway', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止网关并关闭所有连接"""
+        if not self.is_running:
+            return
+        self.is_running = False
+        self.wakeup()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        for conn in list(self.connections):
+            self._close(conn)
+        for listener in self._listeners:
+            listener.close()
+        self._listeners = []
+        self._wake_r.close()
+        self._wake_w.close()
+        self.selector.close()
+
+    def wakeup(self):
+        """唤醒网关线程处理新的待发送数据"""
+        try:
+            self._wake_w.send(b'\0')
+        except (BlockingIOError, OSError, AttributeError):
+            pass
+
+    def request_close(self, conn, reason):
+        """请求网关线程关闭连接(可在任意线程调用)"""
+        print(f"关闭长连接 {conn}: {reason}")
+        conn.closed = True
+        self._to_close.append(conn)
+        self.wakeup()
+
+    def report(self):
+        """生成各长连接的统计报告"""
+        if not self.connections:
+            return "没有长连接"
+        lines = []
+        for conn in list(self.connections):
+            lines.append(
+                f"{conn} 收={conn.frames_in} 发={conn.frames_out} 缓冲={len(conn.outbuf)} B "
+                f"状态推送={'开' if conn.stream_state else '关'} 跳过旧状态={conn.states_skipped}"
+            )
+        return "\n".join(lines)
+
+    def _run(self):
+        interval = 1.0 / self.state_rate
+        next_state = time.monotonic() + interval
+        while self.is_running:
+            timeout = max(0.0, next_state - time.monotonic())
+            for key, events in self.selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                elif key.fileobj in self._listeners:
+                    self._accept(key.fileobj, key.data)
+                else:
+                    self._service(key.data, events)
+
+            while self._to_close:
+                self._close(self._to_close.pop())
+
+            now = time.monotonic()
+            if now >= next_state:
+                next_state = now + interval
+                self._publish_state()
+
+            # 有待发送数据的连接尝试直接写出，写不完再等待可写事件
+            for conn in list(self.connections):
+                if conn.outbuf or conn.pending_state is not None:
+                    self._service(conn, selectors.EVENT_WRITE)
+
+    def _service(self, conn, events):
+        """处理单个连接的读写事件，异常只关闭该连接，不影响网关线程和其他连接"""
+        try:
+            if events & selectors.EVENT_READ:
+                self._read(conn)
+            if events & selectors.EVENT_WRITE and not conn.closed:
+                self._flush(conn)
+        except Exception as e:
+            print(f"处理长连接 {conn} 出错: {e}")
+            self._close(conn)
+
+    def _accept(self, listener, websocket):
+        try:
+            sock, peer = listener.accept()
+        except (BlockingIOError, OSError):
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = StreamConnection(self, sock, peer, websocket)
+        self.connections.add(conn)
+        self.selector.register(sock, selectors.EVENT_READ, conn)
+
+    def _close(self, conn):
+        if conn not in self.connections:
+            return
+        self.connections.discard(conn)
+        conn.closed = True
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+        self.controller.sessions.remove(conn)
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(conn)
+            return
+        conn.inbuf += data
+        if len(conn.inbuf) > self.max_frame + 16:
+            # 单帧过大，视为异常客户端
+            if not conn.handshake_done or self._next_frame_length(conn) > self.max_frame:
+                self._close(conn)
+                return
+        if not conn.handshake_done:
+            self._websocket_handshake(conn)
+        if conn.handshake_done:
+            if conn.websocket:
+                self._read_websocket_frames(conn)
+            else:
+                self._read_length_prefixed_frames(conn)
+
+    def _next_frame_length(self, conn):
+        if conn.websocket:
+            return 0
+        return _LENGTH.unpack_from(conn.inbuf)[0] if len(conn.inbuf) >= 4 else 0
+
+    def _read_length_prefixed_frames(self, conn):
+        buf = conn.inbuf
+        offset = 0
+        while len(buf) - offset >= 4:
+            (length,) = _LENGTH.unpack_from(buf, offset)
+            if length > self.max_frame:
+                self._close(conn)
+                return
+            if len(buf) - offset - 4 < length:
+                break
+            payload = bytes(buf[offset + 4:offset + 4 + length])
+            offset += 4 + length
+            self._on_frame(conn, payload)
+        del buf[:offset]
+
+    def _websocket_handshake(self, conn):
+        end = conn.inbuf.find(b'\r\n\r\n')
+        if end < 0:
+            return
+        request = bytes(conn.inbuf[:end]).decode('latin-1')
+        del conn.inbuf[:end + 4]
+        key = None
+        for line in request.split('\r\n')[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'sec-websocket-key':
+                key = value.strip()
+        if not key:
+            self._send_and_close(conn, b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            return
+        accept = base64.b64encode(hashlib.sha1(key.encode('latin-1') + WS_GUID).digest()).decode('ascii')
+        response = (
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        )
+        with conn.lock:
+            conn.outbuf += response.encode('ascii')
+        conn.handshake_done = True
+
+    def _read_websocket_frames(self, conn):
+        buf = conn.inbuf
+        offset = 0
+        while len(buf) - offset >= 2:
+            first, second = buf[offset], buf[offset + 1]
+            opcode = first & 0x0F
+            masked = second & 0x80
+            length = second & 0x7F
+            pos = offset + 2
+            if length == 126:
+                if len(buf) - pos < 2:
+                    break
+                (length,) = struct.unpack_from('!H', buf, pos)
+                pos += 2
+            elif length == 127:
+                if len(buf) - pos < 8:
+                    break
+                (length,) = struct.unpack_from('!Q', buf, pos)
+                pos += 8
+            if length > self.max_frame:
+                self._close(conn)
+                return
+            if opcode & 0x8 and (length > 125 or not first & 0x80):
+                # RFC 6455: 控制帧的负载不能超过125字节且不能分片，按协议错误(1002)关闭该连接
+                self._send_and_close(conn, b'\x88\x02\x03\xea')
+                return
+            mask = b''
+            if masked:
+                if len(buf) - pos < 4:
+                    break
+                mask = bytes(buf[pos:pos + 4])
+                pos += 4
+            if len(buf) - pos < length:
+                break
+            payload = bytes(buf[pos:pos + length])
+            offset = pos + length
+            if masked:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            if opcode in (0x1, 0x2):
+                self._on_frame(conn, payload)
+            elif opcode == 0x8:
+                # 关闭帧：回一个关闭帧后断开
+                self._send_and_close(conn, b'\x88\x00')
+                return
+            elif opcode == 0x9:
+                with conn.lock:
+                    conn.outbuf += struct.pack('!BB', 0x8A, len(payload)) + payload
+        del buf[:offset]
+
+    def _send_and_close(self, conn, data):
+        """尽力发送最后一段数据后关闭连接"""
+        try:
+            conn.sock.send(data)
+        except OSError:
+            pass
+        self._close(conn)
+
+    def _on_frame(self, conn, payload):
+        conn.frames_in += 1
+        try:
+            command = self.controller.command_parser.decode_command(payload)
+        except UnicodeDecodeError:
+            return
+        self.controller.submit_command(command, conn)
+
+    def _flush(self, conn):
+        with conn.lock:
+            if conn.pending_state is not None and len(conn.outbuf) < self.high_water:
+                conn.outbuf += conn._encode(conn.pending_state)
+                conn.pending_state = None
+                conn.frames_out += 1
+            if not conn.outbuf:
+                return
+            try:
+                sent = conn.sock.send(conn.outbuf)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                conn.closed = True
+                self._to_close.append(conn)
+                return
+            del conn.outbuf[:sent]
+            pending = bool(conn.outbuf)
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+        try:
+            self.selector.modify(conn.sock, events, conn)
+        except (KeyError, ValueError):
+            pass
+
+    def _publish_state(self):
+        """向订阅状态推送的连接发送最新的车辆状态"""
+        subscribers = [conn for conn in self.connections if conn.stream_state and conn.handshake_done]
+        if not subscribers:
+            return
+        payload = self.controller.state_snapshot()
+        if payload is None:
+            return
+        for conn in subscribers:
+            conn.send_state(payload)
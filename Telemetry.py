@@ -0,0 +1,126 @@
+import socket
+import struct
+import threading
+import time
+
+from Command import DriveMode
+
+
+# 遥测记录格式(网络字节序，共72字节)：
+#   magic(2s)='AS' version(B) flags(B) seq(I) timestamp(d, Unix时间)
+#   speed(f) x y z(f) vx vy vz(f) qw qx qy qz(f) throttle brake steering(f)
+# flags: bit0=自动驾驶模式, bit1=已有车辆状态
+RECORD = struct.Struct('!2sBBId14f')
+MAGIC = b'AS'
+VERSION = 1
+FLAG_AUTONOMOUS = 0x01
+FLAG_HAS_STATE = 0x02
+
+RECORD_FIELDS = (
+    'version', 'flags', 'seq', 'timestamp', 'speed', 'x', 'y', 'z', 'vx', 'vy', 'vz',
+    'qw', 'qx', 'qy', 'qz', 'throttle', 'brake', 'steering',
+)
+
+
+def decode_record(data):
+    """
+    解析一条遥测记录(供监听端使用)
+    :return: 字段名到值的字典，格式不正确时返回 None
+    """
+    if len(data) < RECORD.size:
+        return None
+    values = RECORD.unpack_from(data)
+    if values[0] != MAGIC:
+        return None
+    return dict(zip(RECORD_FIELDS, values[1:]))
+
+
+class TelemetryPublisher:
+    """
+    组播遥测发布器
+    以固定频率把车辆状态、当前控制量和驾驶模式打包成紧凑的二进制记录发送到UDP组播组，
+    任意数量的监听端加入组播组即可接收，控制器每帧只需一次 sendto。
+    """
+
+    def __init__(self, controller, group='239.255.0.1', port=8090, rate=20.0, ttl=1, interface='0.0.0.0'):
+        self.controller = controller
+        self.group = group
+        self.port = port
+        self.rate = rate  # 发送频率(Hz)
+        self.ttl = ttl  # 组播TTL，1表示只在本网段内传播
+        self.interface = interface  # 发送组播使用的本地网卡地址
+
+        self.sock = None
+        self.seq = 0
+        self.is_running = False
+        self._thread = None
+        self._stop_event = None  # 每次启动新建，重新启动后旧线程仍能看到自己的停止信号
+        self._buffer = bytearray(RECORD.size)
+
+    def start(self):
+        """创建组播套接字并启动发送线程"""
+        if self.is_running:
+            return False
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self.ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.interface))
+        self._stop_event = threading.Event()
+        self.is_running = True
+        self._thread = threading.Thread(
+            target=self._run, args=(self.sock, self._stop_event), name='telemetry', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止发送线程"""
+        if not self.is_running:
+            return False
+        self.is_running = False
+        self._stop_event.set()
+        self._thread.join(timeout=1.0)
+        self._thread = None
+        self.sock.close()
+        self.sock = None
+        return True
+
+    def pack(self):
+        """把当前状态写入预分配的缓冲区，返回该缓冲区"""
+        controller = self.controller
+        predicted = controller.predictor.predict()
+        flags = FLAG_AUTONOMOUS if controller.drive_mode == DriveMode.AUTONOMOUS else 0
+        if predicted is None:
+            speed, (x, y, z), (vx, vy, vz), (qw, qx, qy, qz) = 0.0, (0.0, 0.0, 0.0), (0.0, 0.0, 0.0), (1.0, 0.0, 0.0, 0.0)
+        else:
+            flags |= FLAG_HAS_STATE
+            speed, (x, y, z), (vx, vy, vz), (qw, qx, qy, qz) = predicted
+        controls = controller.control_state
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        RECORD.pack_into(
+            self._buffer, 0, MAGIC, VERSION, flags, self.seq, time.time(),
+            speed, x, y, z, vx, vy, vz, qw, qx, qy, qz,
+            controls.throttle, controls.brake, controls.steering,
+        )
+        return self._buffer
+
+    def _run(self, sock, stop_event):
+        """
+        发送线程
+        :param sock: 本次启动创建的套接字
+        :param stop_event: 本次启动的停止信号
+        """
+        interval = 1.0 / self.rate
+        destination = (self.group, self.port)
+        next_tick = time.monotonic()
+        while not stop_event.is_set():
+            try:
+                sock.sendto(self.pack(), destination)
+            except Exception as e:
+                if not stop_event.is_set():
+                    print(f"发送组播遥测失败: {e}")
+            next_tick += interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                stop_event.wait(delay)
+            else:
+                next_tick = time.monotonic()
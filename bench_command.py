@@ -0,0 +1,84 @@
+"""
+控制命令热路径的微基准测试
+对 w/a/s/d/stop 等高频命令测量 解码 -> 分类 -> 解析 -> 执行 的耗时和每个数据包的内存分配。
+内存分配逐包测量(见 allocated_bytes)，并检查热路径返回的是否为缓存中的同一个对象；
+未缓存的 set 命令作为对照，应当报告非零的分配量。
+用法: python bench_command.py [循环次数]
+"""
+import sys
+import time
+import tracemalloc
+from itertools import repeat
+
+from Command import AirSimCommand, CommandType, ControlState
+
+
+def hot_path(parser, state, data, n):
+    """模拟 udp_listener + handle_command 中对控制命令的处理(不含RPC)"""
+    decode = parser.decode_command
+    classify = parser.classify_command
+    parse = parser.parse_command
+    execute = parser.execute_control
+    control = CommandType.CONTROL  # 枚举的类属性查找本身每次会分配内存，提前取出
+    for _ in repeat(None, n):
+        command = decode(data)
+        classify(command)
+        parsed = parse(command)
+        if parsed[0] is control:
+            execute(parsed[1], state)
+
+
+def allocated_bytes(parser, state, data, trials=1000):
+    """
+    逐个数据包测量内存分配：每次只处理一个数据包，用 tracemalloc 的峰值减去处理前的内存。
+    峰值只反映同时存活的内存，但单个数据包期间分配过的对象在该包处理完之前必然存活过，
+    所以分配后立即释放的字符串/元组也会体现在峰值中。
+    hot_path 自身(迭代器等)的固定开销用 n=0 的调用测出后扣除；真正的分配每次都会出现，
+    而 tracemalloc 内部偶尔的分配只是干扰，所以取多次测量的最小值。
+    :return: 每包分配的字节数
+    """
+    def peak_of(n):
+        least = None
+        for _ in repeat(None, trials):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            hot_path(parser, state, data, n)
+            _, peak = tracemalloc.get_traced_memory()
+            if least is None or peak - before < least:
+                least = peak - before
+        return least
+
+    tracemalloc.start()
+    try:
+        peak_of(1)  # 让 tracemalloc 自身和解释器的首次分配不计入
+        baseline = peak_of(0)
+        return max(peak_of(1) - baseline, 0)
+    finally:
+        tracemalloc.stop()
+
+
+def measure(parser, state, data, n):
+    """返回 (每包耗时ns, 每包分配字节数)"""
+    hot_path(parser, state, data, 1000)  # 预热
+
+    start = time.perf_counter_ns()
+    hot_path(parser, state, data, n)
+    elapsed = time.perf_counter_ns() - start
+    return elapsed / n, allocated_bytes(parser, state, data)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    parser = AirSimCommand()
+    state = ControlState()
+    # 最后两个命令走未缓存的完整解析路径，作为对照应当报告非零的分配量
+    for data in (b'w', b'a', b's', b'd', b'stop', b'W\n', b'get speed', b'set throttle:0.5', b'set steering:-0.25'):
+        ns, allocated = measure(parser, state, data, n)
+        # 命中预解析缓存时每次返回的是同一个对象，说明没有创建新的字符串和元组
+        command = parser.decode_command(data)
+        cached = command is parser.decode_command(data) and parser.parse_command(command) is parser.parse_command(command)
+        print(f"{data!r:20} {ns:8.1f} ns/包  分配 {allocated:4d} 字节/包  缓存命中={cached}")
+
+
+if __name__ == "__main__":
+    main()
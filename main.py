@@ -1,10 +1,13 @@
 import sys
-from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
-from PyQt5.QtCore import QTimer
+import time
+from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox, QLineEdit
+from PyQt5.QtCore import QTimer, QEvent
 from airsim import CarControls ,CarClient
 import airsim
 from AirSimControllerui import Ui_MainWindow
 from AirSimControl import AirSimUDPController, DriveMode
+from PlotPanel import PlotPanel
+from KeyboardTeleop import KeyboardTeleop
 import threading
 
 
@@ -23,6 +26,7 @@ class AirSimController(QMainWindow, Ui_MainWindow):
         self.edit_serverport.setText("41451")
         self.edit_udpserverip.setText("10.20.108.138")
         self.edit_udpserverport.setText("8089")
+        self.init_stream_ports()
 
         # 连接信号槽
         self.btn_connect.clicked.connect(self.connect_airsim)
@@ -38,9 +42,53 @@ class AirSimController(QMainWindow, Ui_MainWindow):
         self.timer.start(100)  # 每100毫秒更新一次
         self.timer.timeout.connect(self.update_vehicle_info) # 每100毫秒更新启动一次timer 则触发发射一次timeout 的信号 更新一次车辆的信息。
 
+        # 初始化实时曲线面板
+        self.init_plot_panel()
 
         # 初始化键盘控制标签
         self.init_key_labels()
+        self.init_teleop()
+
+    def init_stream_ports(self):
+        """在UDP设置中添加TCP/WebSocket长连接网关的端口输入框，留空则不启动对应的服务"""
+        self.edit_tcpport = QLineEdit(self.groupBox_7)
+        self.edit_tcpport.setPlaceholderText("TCP端口(留空不启用)")
+        self.gridLayout.addWidget(self.edit_tcpport, 4, 0, 1, 1)
+        self.edit_wsport = QLineEdit(self.groupBox_7)
+        self.edit_wsport.setPlaceholderText("WebSocket端口(留空不启用)")
+        self.gridLayout.addWidget(self.edit_wsport, 5, 0, 1, 1)
+
+    def init_plot_panel(self):
+        """初始化速度、控制量和轨迹的实时曲线面板"""
+        self.plot_panel = PlotPanel(self.centralwidget)
+        self.gridLayout_5.addWidget(self.plot_panel, 0, 3, 9, 1)
+        self.gridLayout_5.setColumnStretch(3, 1)
+        self.resize(1100, 600)
+
+        # 本地客户端模式下最近一次查询到的车辆信息 (speed, throttle, brake, steering, x, y)
+        self.last_sample = None
+
+        # 以固定的50Hz采样，UDP模式下使用控制器的航位推算结果，不会增加RPC次数
+        self.sample_rate = 50
+        self.plot_panel.set_sample_rate(self.sample_rate)
+        self.sample_timer = QTimer(self)
+        self.sample_timer.timeout.connect(self.sample_plot_data)
+        self.sample_timer.start(int(1000 / self.sample_rate))
+
+    def sample_plot_data(self):
+        """向曲线面板追加一个样本"""
+        if not self.airsim_connected:
+            return
+        if self.udp_controller and self.udp_controller.airsim_connected:
+            controller = self.udp_controller
+            controller.update_vehicle_state()
+            controls = controller.car_controls
+            self.plot_panel.append_sample(
+                controller.car_current_speed, controls.throttle, controls.brake, controls.steering,
+                controller.car_xposition, controller.car_yposition,
+            )
+        elif self.last_sample:
+            self.plot_panel.append_sample(*self.last_sample)
 
     def init_key_labels(self):
         """初始化键盘控制标签样式"""
@@ -99,16 +147,21 @@ class AirSimController(QMainWindow, Ui_MainWindow):
 
         try:
             if not self.udp_connected:
+                # 长连接网关的端口，留空表示不启用
+                tcp_port = int(self.edit_tcpport.text()) if self.edit_tcpport.text().strip() else None
+                ws_port = int(self.edit_wsport.text()) if self.edit_wsport.text().strip() else None
                 # 创建新的UDP控制器
-                self.udp_controller = AirSimUDPController(udp_ip=ip, udp_port=port)
+                self.udp_controller = AirSimUDPController(udp_ip=ip, udp_port=port, tcp_port=tcp_port, ws_port=ws_port)
                 if self.airsim_connected:
                     # 如果AirSim已连接，保持连接状态
                     self.udp_controller.airsim_connected = True
                     self.udp_controller.client = self.client
+                    # 为高优先级通道(stop/模式切换)建立独立的RPC连接
+                    self.udp_controller.connect_priority_client(self.edit_serverip.text(), self.edit_serverport.text())
 
                 self.udp_controller.start_udp_server()
                 # 启动监听线程
-                self.udp_listener_thread = threading.Thread(target=self.udp_controller.udp_listener, daemon=True)
+                self.udp_listener_thread = threading.Thread(target=self.udp_controller.udp_listener, name='udp-listener', daemon=True)
                 self.udp_listener_thread.start()
 
                 self.udp_connected = True
@@ -145,8 +198,8 @@ class AirSimController(QMainWindow, Ui_MainWindow):
 
         if mode == DriveMode.AUTONOMOUS:
             # 自动驾驶模式逻辑
-            self.udp_controller.car_controls = CarControls()
-            self.udp_controller.client.setCarControls(self.udp_controller.car_controls)
+            self.teleop.reset()
+            self.udp_controller.reset_controls()
             QMessageBox.information(self, "提示", "已切换至自动驾驶模式")
         else:
             QMessageBox.information(self, "提示", "已切换至手动驾驶模式")
@@ -194,6 +247,7 @@ class AirSimController(QMainWindow, Ui_MainWindow):
             y = position.y_val
             z = position.z_val
             controls = self.client.getCarControls() if hasattr(self, 'client') else CarControls()
+            self.last_sample = (speed, controls.throttle, controls.brake, controls.steering, x, y)
         else:
             return
         # 更新UI
@@ -217,60 +271,79 @@ class AirSimController(QMainWindow, Ui_MainWindow):
         udp_connected = self.udp_controller is not None and self.udp_controller.is_running
         self.edit_udpserverip.setEnabled(not udp_connected)
         self.edit_udpserverport.setEnabled(not udp_connected)
+        self.edit_tcpport.setEnabled(not udp_connected)
+        self.edit_wsport.setEnabled(not udp_connected)
         self.btn_udpstart.setText("断开UDP" if udp_connected else "连接UDP")
 
         # 驾驶模式下拉框只在AirSim连接时启用
         self.cbx_drivetype.setEnabled(self.airsim_connected)
 
+    def init_teleop(self):
+        """初始化键盘遥控：按键只更新状态，由50Hz的定时器平滑生成并下发控制量"""
+        self.teleop = KeyboardTeleop()
+        self.teleop_rate = 50
+        self.teleop_timer = QTimer(self)
+        self.teleop_timer.timeout.connect(self.teleop_step)
+        self.teleop_timer.start(int(1000 / self.teleop_rate))
+        self.teleop_last_step = time.monotonic()
+
+    def teleop_step(self):
+        """定频控制生成器：更新斜坡后的控制量，有变化时下发"""
+        now = time.monotonic()
+        dt = now - self.teleop_last_step
+        self.teleop_last_step = now
+        if not self.airsim_connected:
+            return
+        if not self.teleop.active and self.teleop.brake == self.teleop.coast_brake:
+            return  # 已处于静止状态，不再下发
+        if not self.teleop.step(dt):
+            return
+        teleop = self.teleop
+
+        # 如果有UDP控制器且已连接，与UDP客户端走同一个合并下发路径
+        if self.udp_controller and self.udp_controller.is_running:
+            if self.udp_controller.drive_mode == DriveMode.MANUAL:
+                self.udp_controller.apply_controls(teleop.throttle, teleop.brake, teleop.steering)
+        # 否则直接控制本地客户端(频率同样受定时器限制)
+        elif getattr(self, 'client', None):
+            controls = CarControls()
+            controls.throttle = teleop.throttle
+            controls.brake = teleop.brake
+            controls.steering = teleop.steering
+            self.client.setCarControls(controls)
+
     def keyPressEvent(self, event):
         """键盘按下事件"""
-        if not self.airsim_connected:
+        # 忽略系统的按键自动重复，按键状态只在真正按下/松开时改变
+        if not self.airsim_connected or event.isAutoRepeat():
             return
 
         key = event.text().lower()
         if key in self.key_labels:
             self.key_labels[key].setStyleSheet("background-color: yellow;")
-
-            # 如果有UDP控制器且已连接，通过UDP发送命令
-            if self.udp_controller and self.udp_controller.is_running:
-                if self.udp_controller.drive_mode == DriveMode.MANUAL:
-                    self.udp_controller.handle_command(key)
-            # 否则直接控制本地客户端
-            elif hasattr(self, 'client'):
-                controls = self.client.getCarControls()
-                if key == 'w':
-                    controls.throttle = 0.5
-                    controls.brake = 0
-                elif key == 's':
-                    controls.throttle = -1
-                    controls.brake = 0
-                elif key == 'a':
-                    controls.steering = -0.5
-                elif key == 'd':
-                    controls.steering = 0.5
-                self.client.setCarControls(controls)
+            self.teleop.press(key)
 
     def keyReleaseEvent(self, event):
         """键盘释放事件"""
-        if not self.airsim_connected:
+        if not self.airsim_connected or event.isAutoRepeat():
             return
 
         key = event.text().lower()
         if key in self.key_labels:
             self.key_labels[key].setStyleSheet("background-color: white;")
+            self.teleop.release(key)
 
-            # 停止控制
-            if key in ['w', 's']:
-                if self.udp_controller and self.udp_controller.is_running and self.udp_controller.drive_mode == DriveMode.MANUAL:
-                    self.udp_controller.handle_command("stop")
-                elif hasattr(self, 'client'):
-                    controls = self.client.getCarControls()
-                    controls.throttle = 0
-                    controls.brake = 1
-                    self.client.setCarControls(controls)
+    def changeEvent(self, event):
+        """窗口失去焦点时收不到按键松开事件，松开所有按键避免控制量卡住"""
+        if event.type() == QEvent.ActivationChange and not self.isActiveWindow() and hasattr(self, 'teleop'):
+            for key in list(self.teleop.pressed):
+                self.teleop.release(key)
+                self.key_labels[key].setStyleSheet("background-color: white;")
+        super().changeEvent(event)
 
     def closeEvent(self, event):
         """窗口关闭事件"""
+        self.teleop_timer.stop()
         # 先断开UDP连接
         if self.udp_connected and self.udp_controller:
             self.udp_controller.stop_udp_server()